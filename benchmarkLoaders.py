@@ -0,0 +1,190 @@
+import copy
+import glob
+import json
+import random
+import sys
+import time
+
+import pymunk
+
+from loaders.pymunkLoader import PymunkLoader
+from loaders.scenePrototype import ScenePrototype
+from loaders import spaceTuning
+
+
+def tiledLevel(path:str, tiles:int) -> dict:
+    with open(path, 'r') as f:
+        obj = json.loads(f.read())
+    for body in obj['Bodies'].values():
+        shapes = {}
+        for label, shape in body['shapes'].items():
+            if shape['type'] != 'Line':
+                shapes[label] = shape
+                continue
+            points = shape['internal']['points']
+            width = max(max(p[0], p[2]) for p in points) - min(min(p[0], p[2]) for p in points)
+            for tile in range(tiles):
+                tiled = copy.deepcopy(shape)
+                tiled['internal']['points'] = [[p[0] + tile * width, p[1], p[2] + tile * width, p[3]] for p in points]
+                shapes[f'{label}_{tile}'] = tiled
+        body['shapes'] = shapes
+    return obj
+
+
+def segmentCount(loader:PymunkLoader) -> int:
+    return sum(len(lines) for lines in loader.lines.values())
+
+
+def benchmarkAddAll(obj:dict, repeats:int):
+    best = float('inf')
+    for _ in range(repeats):
+        loader = PymunkLoader(pymunk.Space())
+        loader.loadData(obj)
+        start = time.perf_counter()
+        loader.addAll()
+        best = min(best, time.perf_counter() - start)
+    print(f'  addAll {len(loader.space.shapes):6d} shapes: {best * 1000.0:8.3f} ms')
+
+
+def benchmarkStreaming(obj:dict, vehiclePath:str, steps:int):
+    for streaming in (False, True):
+        space = pymunk.Space()
+        space.gravity = (0.0, -9.81)
+        level = PymunkLoader(space)
+        if streaming:
+            level.enableStreaming(20.0, 1)
+        level.loadData(obj)
+        level.addAll()
+        vehicle = PymunkLoader(space)
+        vehicle.loadFile(vehiclePath)
+        vehicle.addAll()
+        focus = next(iter(vehicle.bodies.values()))
+        start = time.perf_counter()
+        for _ in range(steps):
+            level.updateFocus(focus.position.x, focus.position.y)
+            space.step(1.0 / 60.0)
+        duration = time.perf_counter() - start
+        print(f'  streaming={streaming!s:5} {len(space.shapes):6d} shapes in space: {duration / steps * 1000.0:8.3f} ms/step')
+
+
+def benchmarkSpriteSync(counts, repeats:int):
+    import arcade
+    import PIL.Image
+    from loaders.arcadeLoader import SpriteLoader
+
+    texture = arcade.Texture('benchmark', PIL.Image.new('RGBA', (8, 8), (255, 255, 255, 255)))
+    for count in counts:
+        loader = SpriteLoader(pymunk.Space())
+        for i in range(count):
+            body = pymunk.Body()
+            body.position = (random.uniform(-100.0, 100.0), random.uniform(-100.0, 100.0))
+            body.angle = random.uniform(-3.0, 3.0)
+            loader.bodies[f'BODY_{i}'] = body
+            loader.addSprite({'body': f'BODY_{i}', 'subScale': 1.0, 'subRotate': 0.1,
+                              'subAnchor': [random.uniform(-1.0, 1.0), random.uniform(-1.0, 1.0)]}, texture)
+        for name, update in (('update', loader.update), ('updateVectorized', loader.updateVectorized)):
+            update()
+            best = float('inf')
+            for _ in range(repeats):
+                for body in loader.bodies.values():
+                    body.angle += 0.01
+                start = time.perf_counter()
+                update()
+                best = min(best, time.perf_counter() - start)
+            print(f'  {name:16} {count:6d} proxies: {best * 1000.0:8.3f} ms')
+
+
+def benchmarkBaking(obj:dict, vehiclePath:str, steps:int, tolerance:float):
+    for bake in (False, True):
+        space = pymunk.Space()
+        space.gravity = (0.0, -9.81)
+        level = PymunkLoader(space)
+        if bake:
+            level.enableBaking(tolerance)
+        level.loadData(obj)
+        level.addAll()
+        vehicle = PymunkLoader(space)
+        vehicle.loadFile(vehiclePath)
+        vehicle.addAll()
+        start = time.perf_counter()
+        for _ in range(steps):
+            space.step(1.0 / 60.0)
+        duration = time.perf_counter() - start
+        removed = level.bakeStats['segments'] - level.bakeStats['baked']
+        print(f'  bake={bake!s:5} {segmentCount(level):6d} segments ({removed} removed): {duration / steps * 1000.0:8.3f} ms/step')
+
+
+def benchmarkTuning(path:str, copies:int, steps:int):
+    prototype = ScenePrototype.fromFile(path)
+    for tune in (False, True):
+        space = pymunk.Space()
+        space.gravity = (0.0, -9.81)
+        floor = pymunk.Segment(space.static_body, (-100.0, -10.0), (1000.0, -10.0), 0.1)
+        space.add(floor)
+        for i in range(copies):
+            prototype.instantiate(space, ((i % 50) * 15.0, (i // 50) * 15.0))
+        if tune:
+            choice = spaceTuning.tuneSpace(space)
+        start = time.perf_counter()
+        for _ in range(steps):
+            space.step(1.0 / 60.0)
+        duration = time.perf_counter() - start
+        hashInfo = f"hash dim={choice['dim']:.2f}" if tune and choice['useSpatialHash'] else 'bb tree'
+        print(f'  tune={tune!s:5} x{copies} {len(space.shapes):6d} shapes, {hashInfo:16}: {duration / steps * 1000.0:8.3f} ms/step')
+
+
+# loose debris flying around or the same circles packed into a falling pile
+def debrisSpace(count:int, packed:bool) -> pymunk.Space:
+    random.seed(1)
+    space = pymunk.Space()
+    if packed:
+        space.gravity = (0.0, -9.81)
+        space.add(*[pymunk.Segment(space.static_body, (x, 0.0), (x + 1.0, 0.0), 0.1) for x in range(60)])
+    for i in range(count):
+        body = pymunk.Body()
+        if packed:
+            body.position = (random.uniform(1.0, 59.0), 1.0 + i * 0.02)
+        else:
+            body.position = (random.uniform(0.0, 150.0), random.uniform(0.0, 150.0))
+            body.velocity = (random.uniform(-5.0, 5.0), random.uniform(-5.0, 5.0))
+        shape = pymunk.Circle(body, 0.5)
+        shape.density = 1.0
+        space.add(body, shape)
+    return space
+
+
+def benchmarkTuningDebris(count:int, steps:int, packed:bool=False):
+    for tune in (False, True):
+        space = debrisSpace(count, packed)
+        if tune:
+            choice = spaceTuning.tuneSpace(space)
+        start = time.perf_counter()
+        for _ in range(steps):
+            space.step(1.0 / 60.0)
+        duration = time.perf_counter() - start
+        hashInfo = f"hash dim={choice['dim']:.2f}" if tune and choice['useSpatialHash'] else 'bb tree'
+        kind = 'packed' if packed else 'loose'
+        print(f'  tune={tune!s:5} {count:6d} {kind:6} circles, {hashInfo:16}: {duration / steps * 1000.0:8.3f} ms/step')
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'data/states/level.json'
+    for tiles in (1, 10, 50):
+        obj = tiledLevel(path, tiles)
+        probe = PymunkLoader(pymunk.Space())
+        probe.loadData(obj)
+        print(f'{path} x{tiles} ({segmentCount(probe)} segments)')
+        benchmarkAddAll(obj, 5)
+        benchmarkStreaming(obj, 'data/states/car1.json', 300)
+        benchmarkBaking(obj, 'data/states/car1.json', 300, 0.05)
+    print('broadphase tuning')
+    for scene in sorted(glob.glob('data/states/*.json')):
+        print(scene)
+        for copies in (1, 500):
+            benchmarkTuning(scene, copies, 100)
+    print('debris')
+    for count in (2000, 5000):
+        for packed in (False, True):
+            benchmarkTuningDebris(count, 100, packed)
+    print('sprite sync')
+    benchmarkSpriteSync((100, 1000, 10000), 5)
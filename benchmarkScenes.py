@@ -0,0 +1,116 @@
+import argparse
+import json
+import platform
+import sys
+import time
+
+import pymunk
+
+from loaders.loadProfiler import LoadProfiler
+from loaders.pymunkLoader import PymunkLoader
+from loaders.scenePrototype import ScenePrototype
+
+
+def percentile(values, fraction:float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+# scene arguments are "path" or "path:instances"
+def parseScene(arg:str):
+    path, _, count = arg.rpartition(':')
+    if path and count.isdigit():
+        return path, int(count)
+    return arg, 1
+
+
+def loadScenes(space:pymunk.Space, scenes, spacing:float, profiler:LoadProfiler=None):
+    results = []
+    for path, instances in scenes:
+        start = time.perf_counter()
+        loader = PymunkLoader(space)
+        if profiler:
+            loader.enableProfiling(profiler)
+        loader.loadFile(path)
+        loader.addAll()
+        loadTime = time.perf_counter() - start
+
+        instanceTime = 0.0
+        if instances > 1:
+            start = time.perf_counter()
+            prototype = ScenePrototype.fromFile(path)
+            for i in range(1, instances):
+                prototype.instantiate(space, (i * spacing, 0.0))
+            instanceTime = time.perf_counter() - start
+        results.append({'path': path,
+                        'instances': instances,
+                        'loadTime': loadTime,
+                        'instanceTime': instanceTime})
+    return results
+
+
+def run(args) -> dict:
+    space = pymunk.Space()
+    space.gravity = (0.0, args.gravity)
+    profiler = LoadProfiler() if args.trace else None
+    scenes = loadScenes(space, [parseScene(scene) for scene in args.scenes], args.spacing, profiler)
+    if profiler:
+        print(profiler.report().format())
+        profiler.writeTrace(args.trace)
+
+    for _ in range(args.warmup):
+        space.step(args.dt)
+    stepTimes = []
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        stepStart = time.perf_counter()
+        space.step(args.dt)
+        stepTimes.append(time.perf_counter() - stepStart)
+    total = time.perf_counter() - start
+
+    return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pymunk': pymunk.version,
+            'platform': platform.platform(),
+            'scenes': scenes,
+            'bodies': len(space.bodies),
+            'shapes': len(space.shapes),
+            'constraints': len(space.constraints),
+            'dt': args.dt,
+            'steps': args.steps,
+            'stepTime': {'mean': total / args.steps,
+                         'p50': percentile(stepTimes, 0.5),
+                         'p90': percentile(stepTimes, 0.9),
+                         'p99': percentile(stepTimes, 0.99),
+                         'max': max(stepTimes)},
+            'stepsPerSecond': args.steps / total}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Headless load and step benchmark of exported scenes.')
+    parser.add_argument('scenes', nargs='+', help='exported JSON scene, optionally path:instances')
+    parser.add_argument('--steps', type=int, default=1000)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--dt', type=float, default=1.0 / 60.0)
+    parser.add_argument('--gravity', type=float, default=-9.81)
+    parser.add_argument('--spacing', type=float, default=15.0, help='x distance between instances')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--trace', help='profile loading and write a Chrome trace to this file')
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    for scene in result['scenes']:
+        print(f"{scene['path']} x{scene['instances']}: load {scene['loadTime'] * 1000.0:.3f} ms, "
+              f"instances {scene['instanceTime'] * 1000.0:.3f} ms")
+    step = result['stepTime']
+    print(f"{result['bodies']} bodies, {result['shapes']} shapes, {result['constraints']} constraints")
+    print(f"step mean {step['mean'] * 1000.0:.3f} ms, p50 {step['p50'] * 1000.0:.3f} ms, "
+          f"p90 {step['p90'] * 1000.0:.3f} ms, p99 {step['p99'] * 1000.0:.3f} ms, max {step['max'] * 1000.0:.3f} ms")
+    print(f"{result['stepsPerSecond']:.1f} steps/s")
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
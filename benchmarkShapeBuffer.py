@@ -0,0 +1,67 @@
+import random
+import sys
+import time
+from array import array
+
+from editorCode.shapeBuffer import ShapeBuffer
+from editorCode.config import pointConfig
+
+
+# points, edges and circles in the proportions of a busy editor view
+def buildFrame(buffer:ShapeBuffer, vertices:int):
+    random.seed(1)
+    buffer.reset()
+    color = pointConfig['inactivePointColor']
+    while buffer.currentIndex < vertices:
+        x = random.uniform(-100.0, 100.0)
+        y = random.uniform(-100.0, 100.0)
+        buffer.addPointXY(x, y, color, 0.1)
+        buffer.addEdgeXY(x, y, x + 1.0, y + 1.0, color)
+        if buffer.currentIndex % 10 == 0:
+            buffer.addCircleXYFromXY(x, y, 1.0, 0.0, 32, color)
+
+
+def benchmarkBuild(vertices:int, repeats:int):
+    buffer = ShapeBuffer()
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        buildFrame(buffer, vertices)
+        best = min(best, time.perf_counter() - start)
+    size = buffer.verts.itemsize * len(buffer.verts) + len(buffer.colors) + buffer.indices.itemsize * len(buffer.indices)
+    print(f'  build {buffer.currentIndex:7d} vertices, {len(buffer.indices):7d} indices: {best * 1000.0:8.3f} ms, {size / 1024.0:8.1f} KiB')
+
+    # what the shaders did with list buffers before every upload, typed
+    # buffers are written through the buffer protocol as they are
+    verts, colors, indices = buffer.verts.tolist(), list(buffer.colors), buffer.indices.tolist()
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        array('f', verts), array('B', colors), array('I', indices)
+        best = min(best, time.perf_counter() - start)
+    print(f'  list to array conversion avoided per upload: {best * 1000.0:8.3f} ms')
+
+
+# fixed segment counts, arcSegmentPixels 0 keeps the counts given by the caller
+def benchmarkCircles(circles:int, repeats:int):
+    buffer = ShapeBuffer()
+    color = pointConfig['inactivePointColor']
+    pixels = pointConfig['arcSegmentPixels']
+    pointConfig['arcSegmentPixels'] = 0.0
+    for segments in (8, 16, 32, 128):
+        best = float('inf')
+        for _ in range(repeats):
+            buffer.reset()
+            start = time.perf_counter()
+            for i in range(circles):
+                buffer.addCircleXYFromXY(float(i), 0.0, 1.0, 0.0, segments, color)
+            best = min(best, time.perf_counter() - start)
+        print(f'  {circles} circles of {segments:3d} segments: {best * 1000.0:8.3f} ms')
+    pointConfig['arcSegmentPixels'] = pixels
+
+
+if __name__ == '__main__':
+    vertices = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f'ShapeBuffer frame of {vertices} vertices')
+    benchmarkBuild(vertices, 10)
+    benchmarkCircles(1000, 10)
@@ -2,12 +2,13 @@ from typing import Dict
 from .database import Database
 from .config import app
 from .textureContainerI import TextureContainerI
+from geometry.convexDecomposition import decompose
 import json
 
 class JSONIO:
 
     @staticmethod
-    def save(path:str):
+    def save(path:str, decomposeConcave:bool=False):
         tmp = {}
         bodies = {}
         db = Database.getInstance()
@@ -15,6 +16,8 @@ class JSONIO:
             body.updatePos(body.transform.getMat())
             body.recalcPhysics()
             body.getJSONDict(bodies)
+        if decomposeConcave:
+            JSONIO.addConvexPieces(bodies)
         constraints = {}
         for constraint in db.constraints:
             if constraint.bodyA and constraint.bodyB:
@@ -33,4 +36,15 @@ class JSONIO:
         with open(path, 'w') as f:
             f.write(json.dumps(tmp, indent=2))
 
+    # concave polygons get their convex pieces next to the original points,
+    # loaders with decomposition enabled use them instead of the convex hull
+    @staticmethod
+    def addConvexPieces(bodies:Dict):
+        for body in bodies.values():
+            for shape in body['shapes'].values():
+                if shape['type'] == 'Polygon':
+                    pieces = decompose(shape['internal']['points'])
+                    if len(pieces) > 1:
+                        shape['internal']['convex'] = [[list(point) for point in piece] for piece in pieces]
+
 
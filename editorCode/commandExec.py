@@ -1,7 +1,7 @@
 from typing import List, Literal, Union, Tuple
 
 from .JSONIO import JSONIO
-from .config import app
+from .config import app, exportSetup
 from .editorShapes import Container
 from .shapeInternals.editorShapeI import ShapeI
 from .shapeInternals.editorBodyI import BodyI
@@ -50,7 +50,7 @@ class ComExport(Command):
         self.filename = filename
 
     def execute(self):
-        JSONIO.save(self.filename)
+        JSONIO.save(self.filename, exportSetup['decomposeConcave'])
 
 
 class ComSave(Command):
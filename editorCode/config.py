@@ -7,6 +7,8 @@ app = {'version': '0.0.2'}
 physicsSetup = {'pixelPerMeter': 32.0,
                 'measureInPixels': True}
 
+exportSetup = {'decomposeConcave': False}
+
 globalWindowSetup = {'width': 800, 
                      'height': 600,
                      'title': 'Pymunk Physics Editor',
@@ -54,7 +56,11 @@ pointConfig = {'pointHalfWH':  3,
                'cogHalfWH': 3.0,
                'cogColor': (200,100,100, 255),
                'transformArmLength': physicsSetup['pixelPerMeter'],
-               'transformColor': (150,200,150, 255)}
+               'transformColor': (150,200,150, 255),
+               # arcs get one segment per this many pixels on screen, 0 keeps the callers counts
+               'arcSegmentPixels': 6.0,
+               'arcSegmentsMin': 8,
+               'arcSegmentsMax': 256}
 
 
 def toJSON(data: dict) -> str:
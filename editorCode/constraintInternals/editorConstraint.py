@@ -29,6 +29,9 @@ class DampedRotarySpring(ConstraintI):
             buffer.addAngleArm(self.bodyB.physics.cog.final, 
                          self.restAngle.cos, self.restAngle.sin)
 
+    def bufferKey(self) -> tuple:
+        return super().bufferKey() + (self.restAngle.angle,)
+
     def getJSONDict(self, parent:dict):
         assert self.label not in parent
         this = {}
@@ -88,6 +91,10 @@ class DampedSpring(ConstraintI):
         if self.bodyA and self.bodyB:
             buffer.addAnchor(self.anchorB.final)
             
+    def bufferKey(self) -> tuple:
+        return super().bufferKey() + (self.anchorA.final.x, self.anchorA.final.y,
+                                    self.anchorB.final.x, self.anchorB.final.y, self.restLength)
+
     def getJSONDict(self, parent:dict):
         assert self.label not in parent
         this = {}
@@ -147,6 +154,9 @@ class GearJoint(ConstraintI):
             buffer.addAngleRatioArm(self.bodyB.physics.cog.final, 
                               self.phase.cos, self.phase.sin, self.ratio)
 
+    def bufferKey(self) -> tuple:
+        return super().bufferKey() + (self.phase.angle, self.ratio)
+
     def getJSONDict(self, parent:dict):
         assert self.label not in parent
         this = {}
@@ -206,6 +216,10 @@ class GrooveJoint(ConstraintI):
         if self.bodyA and self.bodyB:
             buffer.addAnchor(self.anchorB.final)
       
+    def bufferKey(self) -> tuple:
+        return super().bufferKey() + (self.grooveA.final.x, self.grooveA.final.y, self.grooveB.final.x,
+                                    self.grooveB.final.y, self.anchorB.final.x, self.anchorB.final.y)
+
     def getJSONDict(self, parent:dict):
         assert self.label not in parent
         this = {}
@@ -262,6 +276,10 @@ class PinJoint(ConstraintI):
         if self.bodyA and self.bodyB:
             buffer.addAnchor(self.anchorB.final)
 
+    def bufferKey(self) -> tuple:
+        return super().bufferKey() + (self.anchorA.final.x, self.anchorA.final.y,
+                                    self.anchorB.final.x, self.anchorB.final.y)
+
     def getJSONDict(self, parent:dict):
         assert self.label not in parent
         this = {}
@@ -316,6 +334,10 @@ class PivotJoint(ConstraintI):
         if self.bodyA and self.bodyB:
             buffer.addAnchor(self.anchorB.final)
 
+    def bufferKey(self) -> tuple:
+        return super().bufferKey() + (self.anchorA.final.x, self.anchorA.final.y,
+                                    self.anchorB.final.x, self.anchorB.final.y)
+
     def getJSONDict(self, parent:dict):
         assert self.label not in parent
         this = {}
@@ -370,6 +392,9 @@ class RatchetJoint(ConstraintI):
                          self.phase.cos, self.phase.sin)
             buffer.addRatchetB(self.bodyB.physics.cog.final, self.phase, self.ratchet)
 
+    def bufferKey(self) -> tuple:
+        return super().bufferKey() + (self.phase.angle, self.ratchet.angle)
+
     def getJSONDict(self, parent:dict):
         assert self.label not in parent
         this = {}
@@ -418,6 +443,9 @@ class RotaryLimitJoint(ConstraintI):
         if self.bodyA and self.bodyB:
             buffer.addPhaseMinMaxB(self.bodyB.physics.cog.final, self.min, self.max)
 
+    def bufferKey(self) -> tuple:
+        return super().bufferKey() + (self.min.angle, self.max.angle)
+
     def getJSONDict(self, parent:dict):
         assert self.label not in parent
         this = {}
@@ -465,6 +493,9 @@ class SimpleMotor(ConstraintI):
         if self.bodyA and self.bodyB:
             buffer.addRateB(self.bodyB.physics.cog.final, self.rate)
 
+    def bufferKey(self) -> tuple:
+        return super().bufferKey() + (self.rate.angle,)
+
     def getJSONDict(self, parent:dict):
         assert self.label not in parent
         this = {}
@@ -519,6 +550,10 @@ class SlideJoint(ConstraintI):
         if self.bodyA and self.bodyB:
             buffer.addAnchor(self.anchorB.final)
 
+    def bufferKey(self) -> tuple:
+        return super().bufferKey() + (self.anchorA.final.x, self.anchorA.final.y,
+                                    self.anchorB.final.x, self.anchorB.final.y, self.min, self.max)
+
     def getJSONDict(self, parent:dict):
         assert self.label not in parent
         this = {}
@@ -57,6 +57,15 @@ class ConstraintI:
     def bufferInternalB(self, buffer:ShapeBuffer):
         pass
 
+    # changes whenever the lines added by bufferInternals change, subclasses
+    # append the parameters their bufferInternals reads
+    def bufferKey(self) -> tuple:
+        if self.bodyA and self.bodyB:
+            cogA = self.bodyA.physics.cog.final
+            cogB = self.bodyB.physics.cog.final
+            return (cogA.x, cogA.y, cogB.x, cogB.y)
+        return ()
+
     def bufferBodies(self, buffer:ShapeBuffer):
         if self.bodyA and self.bodyB:
             self.bodyA.bufferData(buffer)
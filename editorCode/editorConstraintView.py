@@ -15,6 +15,7 @@ from .commandExec import ComSetSlideMaxFromCoords, ComSetSlideMinFromCoords
 
 from .shapeBuffer import ShapeBuffer
 from .lineShader import LineDraw
+from .markerShader import MarkerDraw
 from .gridShader import GridDraw
 from .glContext import GLContextI
 
@@ -64,7 +65,13 @@ class EditorConstraintView:
         self.objectsUnderCursor = []
         self.hideOthers = False
 
+        # one per viewport so every one keeps its retained geometry
         self.shader = LineDraw()
+        self.shaderBodyA = LineDraw()
+        self.shaderBodyB = LineDraw()
+        self.markerShader = MarkerDraw()
+        self.markerShaderBodyA = MarkerDraw()
+        self.markerShaderBodyB = MarkerDraw()
         self.gridShader = GridDraw()
         #self.moveView(-width/2, -height/2)
 
@@ -178,46 +185,58 @@ class EditorConstraintView:
 
             
             
-            buffer.reset()
+            bodyA = constraint.bodyA
+            bodyB = constraint.bodyB
+            keyA = (bodyA, bodyB, bodyA.bufferKey() if bodyA else None)
+            keyB = (bodyA, bodyB, bodyB.bufferKey() if bodyB else None)
+            internalsKey = (constraint, constraint.bufferKey())
+
+            buffer.reset(self.shader.retained, True)
             buffer.drawScale = self.viewAllOffset.scale
 
-            constraint.bufferBodies(buffer)
-            constraint.bufferInternals(buffer)
+            buffer.retain('bodies', keyA + keyB, lambda: constraint.bufferBodies(buffer))
+            buffer.retain('internals', internalsKey, lambda: constraint.bufferInternals(buffer))
 
             buffer.addHelperPoint(self.pivot)
-            self.shader.update(buffer.verts, buffer.colors, buffer.indices)
+            self.shader.updateRetained(buffer)
+            self.markerShader.updateRetained(buffer)
 
             self.shader.draw()
+            self.markerShader.draw()
             
 
-            buffer.reset()
+            buffer.reset(self.shaderBodyA.retained, True)
             buffer.drawScale = self.viewBodyAOffset.scale
 
             context.setProjectionAndViewportFromCamera(self.viewBodyAOffset)
 
             self.gridShader.drawGrid(self.viewBodyAOffset)
 
-            constraint.bufferBodyA(buffer)
-            constraint.bufferInternalA(buffer)
+            buffer.retain('bodies', keyA, lambda: constraint.bufferBodyA(buffer))
+            buffer.retain('internals', internalsKey, lambda: constraint.bufferInternalA(buffer))
 
             buffer.addHelperPoint(self.pivot)
-            self.shader.update(buffer.verts, buffer.colors, buffer.indices)
+            self.shaderBodyA.updateRetained(buffer)
+            self.markerShaderBodyA.updateRetained(buffer)
 
-            self.shader.draw()
+            self.shaderBodyA.draw()
+            self.markerShaderBodyA.draw()
 
-            buffer.reset()
+            buffer.reset(self.shaderBodyB.retained, True)
             buffer.drawScale = self.viewBodyBOffset.scale
 
             context.setProjectionAndViewportFromCamera(self.viewBodyBOffset)
             self.gridShader.drawGrid(self.viewBodyBOffset)
 
-            constraint.bufferBodyB(buffer)
-            constraint.bufferInternalB(buffer)
+            buffer.retain('bodies', keyB, lambda: constraint.bufferBodyB(buffer))
+            buffer.retain('internals', internalsKey, lambda: constraint.bufferInternalB(buffer))
 
             buffer.addHelperPoint(self.pivot)
-            self.shader.update(buffer.verts, buffer.colors, buffer.indices)
+            self.shaderBodyB.updateRetained(buffer)
+            self.markerShaderBodyB.updateRetained(buffer)
 
-            self.shader.draw()
+            self.shaderBodyB.draw()
+            self.markerShaderBodyB.draw()
 
     def defaultAction(self):
         constraint:ConstraintI = EditorState.getInstance().getCurrentConstraint()
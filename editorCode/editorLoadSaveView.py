@@ -11,6 +11,7 @@ from .commandExec import CommandExec
 from .commandExec import ComSetPivot, ComScaleView, ComResizeView, ComMoveCursor, ComMoveView
 from .commandExec import ComStartTransform, ComCancelTransform,ComApplyTransform
 from .lineShader import LineDraw
+from .markerShader import MarkerDraw
 
 from .textureContainerI import TextureContainerI
 from .textureBuffer import TextureBuffer
@@ -34,7 +35,8 @@ class EditorLoadSaveView:
 
         self.transform = ContinuousTransform()
         self.shader = LineDraw()
-        self.texShader = TextureDraw()
+        self.markerShader = MarkerDraw()
+        self.texShader = TextureDraw(layered=True)
         self.gridShader = GridDraw()
         #self.moveView(-width/2, -height/2)
 
@@ -130,41 +132,36 @@ class EditorLoadSaveView:
 
         self.gridShader.drawGrid(self.viewOffset)
 
-        for channel in range(16):
-            texBuffer.reset()
-            for mapping in database.getAllMappingLabelsOfChannel(channel): 
-                texBuffer.addMapping(database.getMappingByLabel(mapping))
-            if texBuffer.indices:
-                textures.use(channel, 0)
-                self.texShader.update(texBuffer.verts, texBuffer.uvs, texBuffer.indices)
-                self.texShader.draw()
+        texBuffer.reset()
+        texBuffer.addMappings(database.getAllMappings())
+        self.texShader.drawLayered(textures, texBuffer)
 
-        buffer.reset()
+        buffer.reset(self.shader.retained, True)
         buffer.drawScale = self.viewOffset.scale
 
         currentBody = state.getCurrentBody()
         if self.hideOthers and currentBody:
 
-            buffer.addBBox(currentBody.box.center.final, currentBody.box.halfWH.final, True, False)
-            currentBody.bufferData(buffer)
-            buffer.addCenterOfGravity(currentBody.physics.cog.final, True)
+            buffer.retainOutlined(currentBody, True, currentBody.box, currentBody.physics.cog.final,
+                                  currentBody.bufferKey(), currentBody.bufferData)
 
         else:
             for body in database.bodies:
                 active = (currentBody == body)
 
-                buffer.addBBox(body.box.center.final, body.box.halfWH.final, active, False)
-                body.bufferData(buffer)
-                buffer.addCenterOfGravity(body.physics.cog.final, True)
+                buffer.retainOutlined(body, active, body.box, body.physics.cog.final,
+                                      body.bufferKey(), body.bufferData)
 
         for constraint in database.constraints:
-            constraint.bufferInternals(buffer)
+            buffer.retain(constraint, constraint.bufferKey(), lambda constraint=constraint: constraint.bufferInternals(buffer))
 
         buffer.addHelperPoint(self.pivot.local)
 
-        self.shader.update(buffer.verts, buffer.colors, buffer.indices)
+        self.shader.updateRetained(buffer)
+        self.markerShader.updateRetained(buffer)
 
         self.shader.draw()
+        self.markerShader.draw()
 
     def undo(self):
         self.clearCurrentOperations()
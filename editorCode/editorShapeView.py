@@ -13,6 +13,7 @@ from .pymunkTester import testShapes
 
 from .shapeBuffer import ShapeBuffer
 from .lineShader import LineDraw
+from .markerShader import MarkerDraw
 
 from .textureContainerI import TextureContainerI
 from .textureBuffer import TextureBuffer
@@ -36,7 +37,8 @@ class EditorShapeView:
 
         self.transform = ContinuousTransform()
         self.shader = LineDraw()
-        self.texShader = TextureDraw()
+        self.markerShader = MarkerDraw()
+        self.texShader = TextureDraw(layered=True)
         self.gridShader = GridDraw()
 
 
@@ -149,25 +151,19 @@ class EditorShapeView:
         self.gridShader.drawGrid(self.viewOffset)
         
         parent = state.getCurrentBody()
-        for channel in range(16):
-            texBuffer.reset()
-            for mapping in database.getAllMappingsOfBodyAndChannel(parent, channel): 
-                texBuffer.addMapping(mapping)
-            if texBuffer.indices:
-                textures.use(channel, 0)
-                self.texShader.update(texBuffer.verts, texBuffer.uvs, texBuffer.indices)
-                self.texShader.draw()
+        texBuffer.reset()
+        texBuffer.addMappings(database.getAllMappingsOfBody(parent))
+        self.texShader.drawLayered(textures, texBuffer)
 
 
-        buffer.reset()
+        buffer.reset(self.shader.retained, True)
         buffer.drawScale = self.viewOffset.scale
 
         if self.hideOthers:
             shape = state.getCurrentShape()
             if shape:
-                buffer.addBBox(shape.box.center.final, shape.box.halfWH.final, True, False)
-                shape.bufferData(buffer)
-                buffer.addCenterOfGravity(shape.physics.cog.final, True)
+                buffer.retainOutlined(shape, True, shape.box, shape.physics.cog.final,
+                                      shape.bufferKey(), shape.bufferData)
 
         else:
             parent = state.getCurrentBody()
@@ -175,15 +171,16 @@ class EditorShapeView:
                 currentShape = state.getCurrentShape()
                 for shape in parent.shapes:
                     active = (currentShape == shape)
-                    buffer.addBBox(shape.box.center.final, shape.box.halfWH.final, active, False)
-                    shape.bufferData(buffer)
-                    buffer.addCenterOfGravity(shape.physics.cog.final, True)
+                    buffer.retainOutlined(shape, active, shape.box, shape.physics.cog.final,
+                                          shape.bufferKey(), shape.bufferData)
 
         buffer.addHelperPoint(self.pivot)
 
-        self.shader.update(buffer.verts, buffer.colors, buffer.indices)
+        self.shader.updateRetained(buffer)
+        self.markerShader.updateRetained(buffer)
 
         self.shader.draw()
+        self.markerShader.draw()
 
     # ######## TODO
     def nextSnappableObject(self):
@@ -7,6 +7,8 @@ from pyglet.math import Mat4
 from typing import List, Tuple
 import arcade
 
+from .shapeBuffer import ShapeBuffer, RetainedGeometry, BufferSlice
+
 class LineDraw:
 
     _instance: "LineDraw" = None
@@ -75,23 +77,80 @@ class LineDraw:
         self.ctx.enable(pyglet.gl.GL_LINE_SMOOTH)
         #ctx.disable(pyglet.gl.GL_DEPTH_TEST)
 
-    def update(self, verts:List[float], colors:List[int], indices:List[int]):
+        # slices cached for this draw and the order they were last uploaded in
+        self.retained = RetainedGeometry()
+        self.layout: List[BufferSlice] = []
+
+    # typed arrays of ShapeBuffer, written through the buffer protocol
+    def update(self, verts:array.array, colors:bytearray, indices:array.array):
         vertsInBytes = len(verts) * 4
         colorsInBytes = len(colors)
         indicesInBytes = len(indices) * 4
 
         if vertsInBytes > self.verts.size:
             self.verts.orphan(size=vertsInBytes)
-        self.verts.write(array.array('f', verts))
+        self.verts.write(verts)
         
         if colorsInBytes > self.colors.size:
             self.colors.orphan(size=colorsInBytes)
-        self.colors.write(array.array('B', colors))
+        self.colors.write(colors)
         
         if indicesInBytes > self.indices.size:
             self.indices.orphan(size=indicesInBytes)
-        self.indices.write(array.array('I', indices))
+        self.indices.write(indices)
+        self.geometry.num_vertices = len(indices)
+        self.layout = []
+
+    # uploads a frame built with buffer.reset(self.retained), unchanged slices
+    # stay where they are and only the dirty ones are written
+    def updateRetained(self, buffer:ShapeBuffer):
+        slices = buffer.frameSlices()
+        immediate = slices[-1]
+
+        layout = self.layout
+        if len(slices) == len(layout) and all(current is previous for current, previous in zip(slices, layout)) and \
+                not any(current.resized() for current in slices[:-1]) and self.fits(immediate):
+            dirty = [current for current in slices[:-1] if current.dirty]
+            # many small writes cost more than one big one
+            if len(dirty) * 2 <= len(slices):
+                for current in dirty + [immediate]:
+                    self.writeSlice(current)
+                self.geometry.num_vertices = immediate.indexOffset + len(immediate.indices)
+                return
+
+        verts = array.array('f')
+        colors = bytearray()
+        indices = array.array('I')
+        for current in slices:
+            current.vertexOffset = len(verts) // 2
+            current.indexOffset = len(indices)
+            verts += current.verts
+            colors += current.colors
+            indices += current.rebasedIndices()
+            current.uploadedVerts = len(current.verts)
+            current.uploadedIndices = len(current.indices)
+            current.dirty = False
+
+        for target, data in ((self.verts, verts), (self.colors, colors), (self.indices, indices)):
+            size = memoryview(data).nbytes
+            if size > target.size:
+                target.orphan(size=size)
+            target.write(data)
         self.geometry.num_vertices = len(indices)
+        self.layout = slices
+
+    def fits(self, current:BufferSlice) -> bool:
+        return (current.vertexOffset * 2 + len(current.verts)) * 4 <= self.verts.size and \
+               (current.vertexOffset * 4 + len(current.colors)) <= self.colors.size and \
+               (current.indexOffset + len(current.indices)) * 4 <= self.indices.size
+
+    def writeSlice(self, current:BufferSlice):
+        self.verts.write(current.verts, offset=current.vertexOffset * 8)
+        self.colors.write(current.colors, offset=current.vertexOffset * 4)
+        self.indices.write(current.rebasedIndices(), offset=current.indexOffset * 4)
+        current.uploadedVerts = len(current.verts)
+        current.uploadedIndices = len(current.indices)
+        current.dirty = False
 
     def draw(self):
         self.geometry.render(self.program)
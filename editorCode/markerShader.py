@@ -0,0 +1,175 @@
+import array
+from arcade.gl import BufferDescription
+
+from typing import List
+import arcade
+
+from .shapeBuffer import ShapeBuffer, BufferSlice, MARKER_SIZE
+
+# points, diamonds and arcs drawn from one record each, the geometry shader
+# expands them to the same outlines ShapeBuffer tessellates for LineDraw
+class MarkerDraw:
+
+    _instance: "MarkerDraw" = None
+
+    @staticmethod
+    def getInstance() -> "MarkerDraw":
+        if MarkerDraw._instance == None:
+            MarkerDraw._instance = MarkerDraw()
+        return MarkerDraw._instance
+
+    def __init__(self):
+        self.ctx = arcade.get_window().ctx
+        vertexShader="""
+            #version 330
+
+            in vec4 inMarker;
+            in vec3 inArc;
+            in vec4 inColor;
+
+            out vec4 gMarker;
+            out vec3 gArc;
+            out vec4 gColor;
+
+            void main() {
+                gMarker = inMarker;
+                gArc = inArc;
+                gColor = inColor;
+            }
+            """
+
+        geometryShader="""
+            #version 330 core
+            layout (points) in;
+            layout (line_strip, max_vertices = 65) out;
+
+            uniform Projection {
+                uniform mat4 matrix;
+            } proj;
+
+            in vec4 gMarker[];
+            in vec3 gArc[];
+            in vec4 gColor[];
+
+            out vec4 fColor;
+
+            void emit(vec2 point) {
+                fColor = gColor[0];
+                gl_Position = proj.matrix * vec4(point, 0.0, 1.0);
+                EmitVertex();
+            }
+
+            void main() {
+                vec2 center = gMarker[0].xy;
+                float size = gMarker[0].z;
+                int kind = int(gMarker[0].w + 0.5);
+
+                if (kind == 0) {
+                    emit(center + vec2(-size, -size));
+                    emit(center + vec2(-size,  size));
+                    emit(center + vec2( size,  size));
+                    emit(center + vec2( size, -size));
+                    emit(center + vec2(-size, -size));
+                } else if (kind == 1) {
+                    emit(center + vec2( size, 0.0));
+                    emit(center + vec2(0.0,  size));
+                    emit(center + vec2(-size, 0.0));
+                    emit(center + vec2(0.0, -size));
+                    emit(center + vec2( size, 0.0));
+                } else {
+                    int segments = clamp(int(gArc[0].z + 0.5), 1, 64);
+                    float step = (gArc[0].y - gArc[0].x) / float(segments);
+                    for (int i = 0; i <= segments; i++) {
+                        float angle = gArc[0].x + step * float(i);
+                        emit(center + size * vec2(cos(angle), sin(angle)));
+                    }
+                }
+                EndPrimitive();
+            }
+            """
+
+        fragmentShader="""
+            #version 330
+
+            in vec4 fColor;
+
+            void main() {
+                gl_FragColor = vec4(fColor.rgb, 1.0);
+            }
+            """
+        self.program = self.ctx.program(vertex_shader=vertexShader, geometry_shader=geometryShader, fragment_shader=fragmentShader)
+
+        markers = array.array('f', [0.0, 0.0, 0.5, 0.0, 0.0, 0.0, 0.0])
+        self.markers = self.ctx.buffer(data=markers, usage='static')
+        markersDescription = BufferDescription(self.markers, '4f 3f', ['inMarker', 'inArc'])
+
+        colors = array.array('B', [255, 255, 255, 255])
+        self.colors = self.ctx.buffer(data=colors, usage='static')
+        colorsDescription = BufferDescription(self.colors, '4f1', ['inColor'], normalized=['inColor'])
+
+        self.geometry = self.ctx.geometry([markersDescription, colorsDescription],
+                                          mode=self.ctx.POINTS)
+        self.geometry.num_vertices = 0
+
+        self.layout: List[BufferSlice] = []
+
+    def update(self, markers:array.array, colors:bytearray):
+        markersInBytes = len(markers) * 4
+        colorsInBytes = len(colors)
+
+        if markersInBytes > self.markers.size:
+            self.markers.orphan(size=markersInBytes)
+        self.markers.write(markers)
+
+        if colorsInBytes > self.colors.size:
+            self.colors.orphan(size=colorsInBytes)
+        self.colors.write(colors)
+        self.geometry.num_vertices = len(markers) // MARKER_SIZE
+        self.layout = []
+
+    # markers of a frame built with buffer.reset(retained, True), written
+    # per slice like LineDraw.updateRetained does with the lines
+    def updateRetained(self, buffer:ShapeBuffer):
+        slices = buffer.frameSlices()
+        immediate = slices[-1]
+
+        layout = self.layout
+        if len(slices) == len(layout) and all(current is previous for current, previous in zip(slices, layout)) and \
+                not any(current.markersResized() for current in slices[:-1]) and self.fits(immediate):
+            dirty = [current for current in slices[:-1] if current.markersDirty]
+            if len(dirty) * 2 <= len(slices):
+                for current in dirty + [immediate]:
+                    self.writeSlice(current)
+                self.geometry.num_vertices = immediate.markerOffset + len(immediate.markers) // MARKER_SIZE
+                return
+
+        markers = array.array('f')
+        colors = bytearray()
+        for current in slices:
+            current.markerOffset = len(markers) // MARKER_SIZE
+            markers += current.markers
+            colors += current.markerColors
+            current.uploadedMarkers = len(current.markers)
+            current.markersDirty = False
+
+        for target, data in ((self.markers, markers), (self.colors, colors)):
+            size = memoryview(data).nbytes
+            if size > target.size:
+                target.orphan(size=size)
+            target.write(data)
+        self.geometry.num_vertices = len(markers) // MARKER_SIZE
+        self.layout = slices
+
+    def fits(self, current:BufferSlice) -> bool:
+        return (current.markerOffset * MARKER_SIZE + len(current.markers)) * 4 <= self.markers.size and \
+               (current.markerOffset * 4 + len(current.markerColors)) <= self.colors.size
+
+    def writeSlice(self, current:BufferSlice):
+        self.markers.write(current.markers, offset=current.markerOffset * MARKER_SIZE * 4)
+        self.colors.write(current.markerColors, offset=current.markerOffset * 4)
+        current.uploadedMarkers = len(current.markers)
+        current.markersDirty = False
+
+    def draw(self):
+        if self.geometry.num_vertices:
+            self.geometry.render(self.program)
@@ -1,8 +1,134 @@
-from typing import List, Tuple
+from typing import Callable, Dict, Hashable, List, Tuple
+from array import array
 import math
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from .config import pointConfig
-from .editorTypes import V2, EditorPoint, UnboundAngle, ContainerTransform
+from .editorTypes import V2, EditorPoint, UnboundAngle, ContainerTransform, BoundingBox
+
+
+# rgba bytes of config colors, one per vertex in ShapeBuffer.colors
+packedColors:Dict[Tuple[int, int, int, int], bytes] = {}
+
+
+def packColor(color:Tuple[int, int, int, int]) -> bytes:
+    packed = packedColors.get(color)
+    if packed is None:
+        packed = packedColors[color] = bytes(color)
+    return packed
+
+
+# marker records expanded by MarkerDraw: x, y, size, kind, from angle, to angle, segments
+MARKER_SIZE = 7
+MARKER_POINT = 0
+MARKER_DIAMOND = 1
+MARKER_ARC = 2
+# most arc segments the marker shader emits, finer arcs are tessellated here
+MARKER_MAX_SEGMENTS = 64
+
+
+# unit circle and line index patterns of one segment count, shared by all arcs
+class ArcTable:
+
+    def __init__(self, segments:int):
+        step = 2.0 * math.pi / segments
+        self.segments = segments
+        # the closing point repeats the first one
+        self.points = [(math.cos(i * step), math.sin(i * step)) for i in range(segments)]
+        self.points.append(self.points[0])
+        # a closed loop over segments points, an open strip over segments + 1
+        self.loop = [index for i in range(segments) for index in (i, (i + 1) % segments)]
+        self.strip = [index for i in range(segments) for index in (i, i + 1)]
+        if np is not None:
+            self.pointsArray = np.array(self.points)
+            self.loopArray = np.array(self.loop, dtype=np.uint32)
+            self.stripArray = np.array(self.strip, dtype=np.uint32)
+
+
+arcTables:Dict[int, ArcTable] = {}
+
+# below this many points plain python beats the numpy call overhead
+VECTORIZE_SEGMENTS = 32
+# finest table an arc uses, very short arcs end up with a single segment
+ARC_TABLE_MAX_SEGMENTS = 4096
+
+
+def arcTable(segments:int) -> ArcTable:
+    table = arcTables.get(segments)
+    if table is None:
+        table = arcTables[segments] = ArcTable(segments)
+    return table
+
+
+# lines of one owner, indices are local to the slice and get rebased on upload
+class BufferSlice:
+
+    def __init__(self, owner:Hashable):
+        self.owner = owner
+        self.key = None
+        self.frame: int = -1
+        self.verts = array('f')
+        self.colors = bytearray()
+        self.indices = array('I')
+        self.markers = array('f')
+        self.markerColors = bytearray()
+        self.dirty: bool = True
+        self.markersDirty: bool = True
+        # placement in the last upload, in vertices, indices and markers
+        self.vertexOffset: int = 0
+        self.indexOffset: int = 0
+        self.markerOffset: int = 0
+        self.uploadedVerts: int = -1
+        self.uploadedIndices: int = -1
+        self.uploadedMarkers: int = -1
+
+    def set(self, key, verts:array, colors:bytearray, indices:array, markers:array, markerColors:bytearray):
+        self.key = key
+        self.verts = verts
+        self.colors = colors
+        self.indices = indices
+        self.markers = markers
+        self.markerColors = markerColors
+        self.dirty = True
+        self.markersDirty = True
+
+    def resized(self) -> bool:
+        return len(self.verts) != self.uploadedVerts or len(self.indices) != self.uploadedIndices
+
+    def markersResized(self) -> bool:
+        return len(self.markers) != self.uploadedMarkers
+
+    def rebasedIndices(self) -> array:
+        base = self.vertexOffset
+        return array('I', [index + base for index in self.indices])
+
+
+# geometry kept between frames for one view, owners with an unchanged key
+# keep their slice and their place in the GPU buffers
+class RetainedGeometry:
+
+    def __init__(self):
+        self.slices: Dict[Hashable, BufferSlice] = {}
+        self.order: List[BufferSlice] = []
+        # lines added outside of retain, rebuilt every frame
+        self.immediate = BufferSlice(None)
+        self.frame: int = 0
+        self.rebuilt: int = 0
+
+    def beginFrame(self):
+        self.order = []
+        self.frame += 1
+        self.rebuilt = 0
+
+    # slices of this frame in draw order, drops the ones of removed owners
+    def endFrame(self) -> List[BufferSlice]:
+        if len(self.slices) != len(self.order):
+            self.slices = {current.owner: current for current in self.order}
+        return self.order + [self.immediate]
 
 
 class ShapeBuffer:
@@ -17,17 +143,74 @@ class ShapeBuffer:
     
     def __init__(self):
         self.drawScale:float = 1.0
-        self.verts: List[float] = []
-        self.colors: List[int] = []
-        self.indices: List[int] = []
+        # typed storage the shaders upload as it is, kept between frames
+        self.verts = array('f')
+        self.colors = bytearray()
+        self.indices = array('I')
         self.currentIndex: int = 0
+        # with markers points, diamonds and arcs go to records for MarkerDraw
+        self.markers = array('f')
+        self.markerColors = bytearray()
+        self.markerMode: bool = False
+        self.retained: RetainedGeometry = None
 
-    def reset(self):
+    def reset(self, retained:RetainedGeometry=None, markers:bool=False):
         self.drawScale:float = 1.0
-        self.verts: List[float] = []
-        self.colors: List[int] = []
-        self.indices: List[int] = []
+        del self.verts[:]
+        del self.colors[:]
+        del self.indices[:]
+        del self.markers[:]
+        del self.markerColors[:]
         self.currentIndex: int = 0
+        self.markerMode = markers
+        self.retained = retained
+        if retained:
+            retained.beginFrame()
+
+    # retained slices of this frame followed by everything added outside of retain
+    def frameSlices(self) -> List[BufferSlice]:
+        immediate = self.retained.immediate
+        immediate.set(None, self.verts, self.colors, self.indices, self.markers, self.markerColors)
+        return self.retained.endFrame()
+
+    # adds the lines build adds for owner, with retained geometry passed to
+    # reset they are only rebuilt after key or the draw scale changed
+    def retain(self, owner:Hashable, key, build:Callable[[], None]):
+        retained = self.retained
+        current = retained.slices.get(owner) if retained else None
+        if retained is None or (current and current.frame == retained.frame):
+            build()
+            return
+
+        if current is None:
+            current = retained.slices[owner] = BufferSlice(owner)
+        current.frame = retained.frame
+        key = (self.drawScale, self.markerMode, key)
+        if current.key != key:
+            verts, colors, indices, currentIndex = self.verts, self.colors, self.indices, self.currentIndex
+            markers, markerColors = self.markers, self.markerColors
+            self.verts, self.colors, self.indices, self.currentIndex = array('f'), bytearray(), array('I'), 0
+            self.markers, self.markerColors = array('f'), bytearray()
+            build()
+            current.set(key, self.verts, self.colors, self.indices, self.markers, self.markerColors)
+            self.verts, self.colors, self.indices, self.currentIndex = verts, colors, indices, currentIndex
+            self.markers, self.markerColors = markers, markerColors
+            retained.rebuilt += 1
+        retained.order.append(current)
+
+    def addMarker(self, x:float, y:float, size:float, kind:int, fromAngle:float, toAngle:float, segments:int, color):
+        self.markers.fromlist([x, y, size, kind, fromAngle, toAngle, segments])
+        self.markerColors += packColor(color)
+
+    # bounding box, lines and center of gravity of a body or a shape as one slice
+    def retainOutlined(self, owner:Hashable, isActive:bool, box:BoundingBox, cog:V2, key,
+                       bufferData:Callable[["ShapeBuffer"], None]):
+        def build():
+            self.addBBox(box.center.final, box.halfWH.final, isActive, False)
+            bufferData(self)
+            self.addCenterOfGravity(cog, True)
+        self.retain(owner, (isActive, box.center.final.x, box.center.final.y, box.halfWH.final.x, box.halfWH.final.y,
+                            cog.x, cog.y, key), build)
 
     def addCapsule(self, frm:V2, to:V2, dist: float):
         capLen = frm.distV(to)
@@ -38,9 +221,8 @@ class ShapeBuffer:
             self.addCircleXYFromXY(to.x, to.y, dist, 0.0, 32, pointConfig['grooveColor'])
             return
         
-        circleParts = math.pi / 16.0
-        sin = math.sin(circleParts)
-        cos = math.cos(circleParts)
+        table = arcTable(self.arcSegments(dist, 2.0 * math.pi, 32))
+        half = table.segments // 2
 
         startOffsetX =   dist * (to.y - frm.y) / capLen
         startOffsetY = - dist * (to.x - frm.x) / capLen
@@ -50,27 +232,13 @@ class ShapeBuffer:
                          to.x + startOffsetX, to.y + startOffsetY, 
                          pointConfig['grooveColor'])
 
-        for i in range(16):
-            endOffsetX = startOffsetX * cos - startOffsetY * sin
-            endOffsetY = startOffsetX * sin + startOffsetY * cos
-            self.addEdgeXY(to.x + startOffsetX, to.y + startOffsetY, 
-                             to.x + endOffsetX, to.y + endOffsetY, 
-                             pointConfig['grooveColor'])
-            startOffsetX = endOffsetX
-            startOffsetY = endOffsetY
-
-        self.addEdgeXY(to.x + startOffsetX, to.y + startOffsetY, 
-                         frm.x + startOffsetX, frm.y + startOffsetY, 
+        self.addTablePoints(to.x, to.y, startOffsetX, startOffsetY, table, half + 1, False, pointConfig['grooveColor'])
+
+        self.addEdgeXY(to.x - startOffsetX, to.y - startOffsetY, 
+                         frm.x - startOffsetX, frm.y - startOffsetY, 
                          pointConfig['grooveColor'])
         
-        for i in range(16):
-            endOffsetX = startOffsetX * cos - startOffsetY * sin
-            endOffsetY = startOffsetX * sin + startOffsetY * cos
-            self.addEdgeXY(frm.x + startOffsetX, frm.y + startOffsetY, 
-                             frm.x + endOffsetX, frm.y + endOffsetY, 
-                             pointConfig['grooveColor'])
-            startOffsetX = endOffsetX
-            startOffsetY = endOffsetY
+        self.addTablePoints(frm.x, frm.y, -startOffsetX, -startOffsetY, table, half + 1, False, pointConfig['grooveColor'])
 
 
     # TODO Add functions below to above class as methods
@@ -236,105 +404,143 @@ class ShapeBuffer:
         self.addPoint(point, pointConfig['anchorColor'], pointConfig['pointHalfWH'] * self.drawScale)    
 
 
-    def addArcXYRad(self, centerX:float, centerY:float, radius:float, fromAngle:float, toAngle:float, elems:int, color):
-        circleELemAngle = (toAngle - fromAngle) / elems
-        cos = math.cos(circleELemAngle)
-        sin = math.sin(circleELemAngle)
+    # segment count of an arc from its length on screen, powers of two keep
+    # the tables few, elems when arcSegmentPixels is 0
+    def arcSegments(self, radius:float, span:float, elems:int) -> int:
+        pixels = pointConfig['arcSegmentPixels']
+        if pixels <= 0.0 or self.drawScale <= 0.0:
+            return elems
+        target = max(abs(radius * span) / self.drawScale / pixels,
+                     pointConfig['arcSegmentsMin'] * abs(span) / (2.0 * math.pi), 2.0)
+        return min(1 << math.ceil(math.log2(target)), pointConfig['arcSegmentsMax'])
 
-        prevX = radius * math.cos(fromAngle)
-        prevY = radius * math.sin(fromAngle)
 
+    # count table points around the center, starting at the offset (startX, startY),
+    # closed loops join the last point to the first
+    def addTablePoints(self, centerX:float, centerY:float, startX:float, startY:float,
+                       table:ArcTable, count:int, closed:bool, color):
         ind = self.currentIndex
-        self.verts += [centerX + prevX, centerY + prevY] 
-        for i in range(elems):
-            postX = prevX * cos - prevY * sin
-            postY = prevX * sin + prevY * cos
-
-            self.verts += [centerX + postX, centerY + postY]
-            self.indices += [ind + i, ind + i + 1]
-
-            prevX = postX
-            prevY = postY
-
-        self.colors += (elems+1) * color
-        self.currentIndex += elems + 1
+        if np is not None and count >= VECTORIZE_SEGMENTS:
+            # rows of (cos, sin) times the rotation of the start offset
+            points = table.pointsArray[:count] @ ((startX, startY), (-startY, startX))
+            points += (centerX, centerY)
+            self.verts.frombytes(points.astype(np.float32).tobytes())
+            indices = table.loopArray if closed else table.stripArray[:2 * (count - 1)]
+            self.indices.frombytes((indices + np.uint32(ind)).tobytes())
+        else:
+            verts = []
+            for x, y in table.points[:count]:
+                verts += (centerX + x * startX - y * startY, centerY + x * startY + y * startX)
+            self.verts.fromlist(verts)
+            indices = table.loop if closed else table.strip[:2 * (count - 1)]
+            self.indices.fromlist([ind + index for index in indices])
+        self.colors += count * packColor(color)
+        self.currentIndex += count
 
 
-    def addCircleXYFromXY(self, centerX:float, centerY:float, halfWHX:float, halfWHY:float, elems:int, color):
-        circleELemAngle = math.pi * 2.0 / elems
-        cos = math.cos(circleELemAngle)
-        sin = math.sin(circleELemAngle)
+    def addArcXYRad(self, centerX:float, centerY:float, radius:float, fromAngle:float, toAngle:float, elems:int, color):
+        elems = self.arcSegments(radius, toAngle - fromAngle, elems)
+        if self.markerMode and elems <= MARKER_MAX_SEGMENTS:
+            self.addMarker(centerX, centerY, radius, MARKER_ARC, fromAngle, toAngle, elems, color)
+            return
 
-        prevX = halfWHX
-        prevY = halfWHY
+        # the full circle table at least as fine as elems across the span, its
+        # points inside the span start at fromAngle and the exact end closes the arc
+        span = toAngle - fromAngle
+        if span < 0.0:
+            fromAngle, span = toAngle, -span
+        segments = ARC_TABLE_MAX_SEGMENTS
+        if span * ARC_TABLE_MAX_SEGMENTS > elems * 2.0 * math.pi:
+            segments = 1 << math.ceil(math.log2(max(elems * 2.0 * math.pi / span, 1.0)))
+        table = arcTable(segments)
+        count = int(span * segments / (2.0 * math.pi)) + 1
+        startX = radius * math.cos(fromAngle)
+        startY = radius * math.sin(fromAngle)
+        if count > segments:
+            # a whole turn or more covers the full circle
+            self.addTablePoints(centerX, centerY, startX, startY, table, segments + 1, False, color)
+            return
+        self.addTablePoints(centerX, centerY, startX, startY, table, count, False, color)
 
         ind = self.currentIndex
-        self.verts += [centerX + prevX, centerY + prevY] 
-        for i in range(elems - 1):
-            postX = prevX * cos - prevY * sin
-            postY = prevX * sin + prevY * cos
-
-            self.verts += [centerX + postX, centerY + postY]
-            self.indices += [ind + i, ind + i + 1]
+        self.verts.fromlist([centerX + radius * math.cos(fromAngle + span),
+                             centerY + radius * math.sin(fromAngle + span)])
+        self.indices.fromlist([ind - 1, ind])
+        self.colors += packColor(color)
+        self.currentIndex += 1
 
-            prevX = postX
-            prevY = postY
 
-        self.indices += [ind + elems - 1, ind]
+    def addCircleXYFromXY(self, centerX:float, centerY:float, halfWHX:float, halfWHY:float, elems:int, color):
+        radius = math.hypot(halfWHX, halfWHY)
+        elems = self.arcSegments(radius, 2.0 * math.pi, elems)
+        if self.markerMode and elems <= MARKER_MAX_SEGMENTS:
+            fromAngle = math.atan2(halfWHY, halfWHX)
+            self.addMarker(centerX, centerY, radius, MARKER_ARC,
+                           fromAngle, fromAngle + 2.0 * math.pi, elems, color)
+            return
 
-        self.colors += elems * color
-        self.currentIndex += elems
+        self.addTablePoints(centerX, centerY, halfWHX, halfWHY, arcTable(elems), elems, True, color)
 
 
     def addDiamond(self, point:V2, color, halfWH:float):
+        if self.markerMode:
+            self.addMarker(point.x, point.y, halfWH, MARKER_DIAMOND, 0.0, 0.0, 0, color)
+            return
+
         ind = self.currentIndex
 
-        self.verts += [point.x + halfWH, point.y,          
+        self.verts.fromlist([point.x + halfWH, point.y,          
                         point.x,          point.y + halfWH,
                         point.x - halfWH, point.y,
-                        point.x,          point.y - halfWH]
-        self.colors += 4 * color
-        self.indices += [ind, ind +1, ind +1, ind +2, ind +2, ind +3, ind +3, ind]
+                        point.x,          point.y - halfWH])
+        self.colors += 4 * packColor(color)
+        self.indices.fromlist([ind, ind +1, ind +1, ind +2, ind +2, ind +3, ind +3, ind])
         self.currentIndex += 4
 
 
     def addPoint(self, point:V2, color, halfWH:float):
+        if self.markerMode:
+            self.addMarker(point.x, point.y, halfWH, MARKER_POINT, 0.0, 0.0, 0, color)
+            return
 
         ind = self.currentIndex
-        self.verts += [point.x-halfWH, point.y-halfWH, point.x-halfWH, point.y+halfWH,
-                        point.x+halfWH, point.y+halfWH, point.x+halfWH, point.y-halfWH]
+        self.verts.fromlist([point.x-halfWH, point.y-halfWH, point.x-halfWH, point.y+halfWH,
+                        point.x+halfWH, point.y+halfWH, point.x+halfWH, point.y-halfWH])
         
-        self.colors += 4 * color
-        self.indices += [ind, ind +1, ind +1, ind +2, ind +2, ind +3, ind +3, ind]
+        self.colors += 4 * packColor(color)
+        self.indices.fromlist([ind, ind +1, ind +1, ind +2, ind +2, ind +3, ind +3, ind])
         self.currentIndex += 4
 
 
     def addPointXY(self, x:float, y:float, color, halfWH:float):
+        if self.markerMode:
+            self.addMarker(x, y, halfWH, MARKER_POINT, 0.0, 0.0, 0, color)
+            return
 
         ind = self.currentIndex
-        self.verts += [x-halfWH, y-halfWH, x-halfWH, y+halfWH,
-                        x+halfWH, y+halfWH, x+halfWH, y-halfWH]
+        self.verts.fromlist([x-halfWH, y-halfWH, x-halfWH, y+halfWH,
+                        x+halfWH, y+halfWH, x+halfWH, y-halfWH])
         
-        self.colors += 4 * color
-        self.indices += [ind, ind +1, ind +1, ind +2, ind +2, ind +3, ind +3, ind]
+        self.colors += 4 * packColor(color)
+        self.indices.fromlist([ind, ind +1, ind +1, ind +2, ind +2, ind +3, ind +3, ind])
         self.currentIndex += 4
 
 
     def addEdge(self, frm:V2, to:V2, color):
 
         ind = self.currentIndex
-        self.verts += [frm.x, frm.y, to.x, to.y]
-        self.colors += 2 * color
-        self.indices += [ind, ind +1]
+        self.verts.fromlist([frm.x, frm.y, to.x, to.y])
+        self.colors += 2 * packColor(color)
+        self.indices.fromlist([ind, ind +1])
         self.currentIndex += 2
 
 
     def addEdgeXY(self, frmX:float, frmY:float, toX:float, toY:float, color):
 
         ind = self.currentIndex
-        self.verts += [frmX, frmY, toX, toY]
-        self.colors += 2 * color
-        self.indices += [ind, ind +1]
+        self.verts.fromlist([frmX, frmY, toX, toY])
+        self.colors += 2 * packColor(color)
+        self.indices.fromlist([ind, ind +1])
         self.currentIndex += 2
 
 
@@ -344,11 +550,11 @@ class ShapeBuffer:
         offsetX = halfWH.x + offset
         offsetY = halfWH.y + offset
         ind = self.currentIndex
-        self.verts += [center.x-offsetX, center.y-offsetY, center.x-offsetX, center.y+offsetY,
-                        center.x+offsetX, center.y+offsetY, center.x+offsetX, center.y-offsetY]
+        self.verts.fromlist([center.x-offsetX, center.y-offsetY, center.x-offsetX, center.y+offsetY,
+                        center.x+offsetX, center.y+offsetY, center.x+offsetX, center.y-offsetY])
         
-        self.colors += 4 * color
-        self.indices += [ind, ind +1, ind +1, ind +2, ind +2, ind +3, ind +3, ind]
+        self.colors += 4 * packColor(color)
+        self.indices.fromlist([ind, ind +1, ind +1, ind +2, ind +2, ind +3, ind +3, ind])
         self.currentIndex += 4
 
 
@@ -360,30 +566,12 @@ class ShapeBuffer:
 
     def addCircle(self, center:V2, radius:float, elems:int):
         color = pointConfig['inactivePointColor']
+        elems = self.arcSegments(radius, 2.0 * math.pi, elems)
+        if self.markerMode and elems <= MARKER_MAX_SEGMENTS:
+            self.addMarker(center.x, center.y, radius, MARKER_ARC, 0.0, 2.0 * math.pi, elems, color)
+            return
 
-        circleELemAngle = math.pi * 2.0 / elems
-        cos = math.cos(circleELemAngle)
-        sin = math.sin(circleELemAngle)
-
-        prevX = radius
-        prevY = 0.0
-
-        ind = self.currentIndex
-        self.verts += [center.x + prevX, center.y + prevY] 
-        for i in range(elems - 1):
-            postX = prevX * cos - prevY * sin
-            postY = prevX * sin + prevY * cos
-
-            self.verts += [center.x + postX, center.y + postY]
-            self.indices += [ind + i, ind + i + 1]
-
-            prevX = postX
-            prevY = postY
-
-        self.indices += [ind + elems - 1, ind]
-
-        self.colors += elems * color
-        self.currentIndex += elems
+        self.addTablePoints(center.x, center.y, radius, 0.0, arcTable(elems), elems, True, color)
 
         # add arm
         # self.verts += [center.x, center.y]
@@ -463,12 +651,12 @@ class ShapeBuffer:
         self.addPoint(cursor, color, pointConfig['cursorHalfWH'] * self.drawScale)
         
         ind = self.currentIndex
-        self.verts += [viewOffset.x, cursor.y,
+        self.verts.fromlist([viewOffset.x, cursor.y,
                         viewOffset.x + viewLimits.x + menuDistance, cursor.y,
                         cursor.x, viewOffset.y, 
-                        cursor.x, viewOffset.y + viewLimits.y] 
-        self.colors += 4 * color
-        self.indices += [ind, ind +1, ind+2, ind+3]
+                        cursor.x, viewOffset.y + viewLimits.y])
+        self.colors += 4 * packColor(color)
+        self.indices.fromlist([ind, ind +1, ind+2, ind+3])
         self.currentIndex += 4
 
     def addBaseUV(self, uvs:List[float], width:int, height:int):
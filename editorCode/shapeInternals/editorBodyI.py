@@ -49,4 +49,7 @@ class BodyI:
     def bufferData(self, buffer:ShapeBuffer):
         for shape in self.shapes:
             shape.bufferData(buffer)
+
+    def bufferKey(self) -> tuple:
+        return tuple(shape.bufferKey() for shape in self.shapes)
     
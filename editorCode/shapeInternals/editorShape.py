@@ -32,6 +32,9 @@ class Circle(ShapeI):
         buffer.addCircle(self.internal.center.final, self.internal.radius.final,
                          self.internal.drawLines)
 
+    def bufferKey(self) -> tuple:
+        return super().bufferKey() + (self.internal.drawLines,)
+
     def setRadius(self, radius:float):
         coords = self.transform.getInvMat().mulRSXY(radius, 0.0)
         self.internal.radius.set(math.sqrt(coords[0] ** 2 + coords[1] **2))
@@ -93,6 +93,11 @@ class ShapeI:
     def bufferData(self, buffer:ShapeBuffer):
         raise NotImplementedError
 
+    # changes whenever the lines added by bufferData change
+    def bufferKey(self) -> tuple:
+        return (self.internal.radius.final,
+                tuple((point.final.x, point.final.y) for point in self.internal.points))
+
     @staticmethod
     def getTypes() -> List[str]:
         return [ShapeI.POLYGON, ShapeI.CIRCLE, ShapeI.BOX, ShapeI.RECT,
@@ -1,6 +1,6 @@
-from typing import List
+from typing import Iterable, List
+from array import array
 import math
-from typing import List
 
 from .config import pointConfig, physicsSetup
 from .editorTypes import V2, EditorPoint, UnboundAngle
@@ -19,31 +19,47 @@ class TextureBuffer:
     def __init__(self):
         # TODO - fix scaling
         self.drawScale:float = physicsSetup['pixelPerMeter']
-        self.verts: List[float] = []
-        self.uvs: List[float] = []
-        self.indices: List[int] = []
+        # typed storage the shader uploads as it is, kept between frames
+        self.verts = array('f')
+        self.uvs = array('f')
+        self.indices = array('I')
+        # texture channel of every vertex and the channels used, for the layered TextureDraw
+        self.layers = array('f')
+        self.channels: List[int] = []
         self.currentIndex: int = 0
 
     def reset(self):
         self.drawScale:float = physicsSetup['pixelPerMeter']
-        self.verts: List[float] = []
-        self.uvs: List[float] = []
-        self.indices: List[int] = []
+        del self.verts[:]
+        del self.uvs[:]
+        del self.indices[:]
+        del self.layers[:]
+        self.channels = []
         self.currentIndex: int = 0
 
     def addBaseQuad(self, width, height):
         ind = self.currentIndex
-        self.verts += [0.0, 0.0, 
+        self.verts.fromlist([0.0, 0.0, 
                        width, 0.0, 
                        0.0, height, 
-                       width, height]
-        self.uvs += [0.0, 0.0, 1.0, 0.0, 0.0, 1.0, 1.0, 1.0]
-        self.indices += [ind, ind +1, ind +2, ind+1, ind+2, ind+3]
+                       width, height])
+        self.uvs.fromlist([0.0, 0.0, 1.0, 0.0, 0.0, 1.0, 1.0, 1.0])
+        self.indices.fromlist([ind, ind +1, ind +2, ind+1, ind+2, ind+3])
+        self.layers.fromlist([0.0, 0.0, 0.0, 0.0])
         self.currentIndex += 6
 
     def addMapping(self, mapping:TextureMapping):
         ind = self.currentIndex
-        self.verts += mapping.getMappingPos()
-        self.uvs += mapping.getMappingUvs()
-        self.indices += [ind, ind +1, ind +2, ind+1, ind+2, ind+3]
-        self.currentIndex += 4
\ No newline at end of file
+        self.verts.fromlist(mapping.getMappingPos())
+        self.uvs.fromlist(mapping.getMappingUvs())
+        self.indices.fromlist([ind, ind +1, ind +2, ind+1, ind+2, ind+3])
+        self.layers.fromlist(4 * [float(mapping.channel)])
+        self.currentIndex += 4
+
+    # all channels in one buffer, drawn in channel order like separate per
+    # channel passes, channels without mappings add nothing
+    def addMappings(self, mappings:Iterable[TextureMapping]):
+        for mapping in sorted(mappings, key=lambda mapping: mapping.channel):
+            if not self.channels or self.channels[-1] != mapping.channel:
+                self.channels.append(mapping.channel)
+            self.addMapping(mapping)
@@ -6,10 +6,56 @@ from pyglet.math import Mat4
 import array
 from typing import List, Tuple
 
+# texture units a layered TextureDraw samples, one per texture channel,
+# OpenGL 3.3 guarantees 16 in the fragment shader
+TEXTURE_LAYERS = 16
+
 class TextureDraw:
 
-    def __init__(self):
+    # layered draws the mappings of all channels at once, every channel bound
+    # to the texture unit of its number and picked by the per vertex layer
+    def __init__(self, layered:bool=False):
         self.ctx = arcade.get_window().ctx
+        self.layered = layered
+        if layered:
+            self.program = self.layeredProgram()
+        else:
+            self.program = self.singleProgram()
+            self.program.set_uniform_safe('currentTexture', 0)
+
+        verts = array.array('f', [
+                        0, 0,
+                        32.0, 0.0,
+                        0.0, 32.0,
+                        32.0, 32.0,
+
+        ])
+        
+        self.verts = self.ctx.buffer(data=verts)
+        vertsDescription = BufferDescription(self.verts, '2f', ['inVert'] )
+
+        uvs = array.array('f', [0.0, 0.0,
+                                   1.0, 0.0,
+                                   0.0, 1.0,
+                                   1.0, 1.0])
+        self.uvs = self.ctx.buffer(data=uvs)
+        uvDescription = BufferDescription(self.uvs, '2f', ['inUV'])
+        descriptions = [vertsDescription, uvDescription]
+
+        if layered:
+            layers = array.array('f', [0.0, 0.0, 0.0, 0.0])
+            self.layers = self.ctx.buffer(data=layers)
+            descriptions.append(BufferDescription(self.layers, '1f', ['inLayer']))
+
+        indices = array.array('I', [0,1,2,1,2,3])
+        self.indices = self.ctx.buffer(data=indices)
+
+        self.geometry = self.ctx.geometry(descriptions, 
+                                     index_buffer=self.indices, 
+                                     mode=self.ctx.TRIANGLES)
+        #self.ctx.disable(pyglet.gl.GL_DEPTH_TEST)
+
+    def singleProgram(self):
         vertexShader="""
             #version 330
 
@@ -39,72 +85,110 @@ class TextureDraw:
                 gl_FragColor = texture(currentTexture, fUV);
             }
             """
-        self.program = self.ctx.program(vertex_shader=vertexShader, fragment_shader=fragmentShader)
+        return self.ctx.program(vertex_shader=vertexShader, fragment_shader=fragmentShader)
 
-        verts = array.array('f', [
-                        0, 0,
-                        32.0, 0.0,
-                        0.0, 32.0,
-                        32.0, 32.0,
+    def layeredProgram(self):
+        vertexShader="""
+            #version 330
 
-        ])
-        
-        self.verts = self.ctx.buffer(data=verts)
-        vertsDescription = BufferDescription(self.verts, '2f', ['inVert'] )
+            uniform Projection {
+                uniform mat4 matrix;
+            } proj;
 
-        uvs = array.array('f', [0.0, 0.0,
-                                   1.0, 0.0,
-                                   0.0, 1.0,
-                                   1.0, 1.0])
-        self.uvs = self.ctx.buffer(data=uvs)
-        uvDescription = BufferDescription(self.uvs, '2f', ['inUV'])
+            in vec2 inVert;
+            in vec2 inUV;
+            in float inLayer;
 
-        indices = array.array('I', [0,1,2,1,2,3])
-        self.indices = self.ctx.buffer(data=indices)
+            out vec2 fUV;
+            flat out int fLayer;
 
-        self.program.set_uniform_safe('currentTexture', 0)
+            void main() {
+                fUV = inUV;
+                fLayer = int(inLayer + 0.5);
+                gl_Position = proj.matrix * vec4(inVert.xy, 0.0, 1.0);
+            }
+            """
 
-        self.geometry = self.ctx.geometry([vertsDescription, uvDescription], 
-                                     index_buffer=self.indices, 
-                                     mode=self.ctx.TRIANGLES)
-        #self.ctx.disable(pyglet.gl.GL_DEPTH_TEST)
+        # GLSL 330 indexes sampler arrays with constants only, the gradients
+        # are taken outside the switch so every case samples like texture()
+        cases = ''.join(f"""
+                    case {layer}: gl_FragColor = textureGrad(layerTextures[{layer}], fUV, uvX, uvY); break;"""
+                          for layer in range(TEXTURE_LAYERS))
 
-    def updateIndices(self, indices:List[int]):
+        fragmentShader=f"""
+            #version 330
+
+            in vec2 fUV;
+            flat in int fLayer;
+
+            uniform sampler2D layerTextures[{TEXTURE_LAYERS}];
+
+            void main() {{
+                vec2 uvX = dFdx(fUV);
+                vec2 uvY = dFdy(fUV);
+                switch (fLayer) {{{cases}
+                    default: discard;
+                }}
+            }}
+            """
+        program = self.ctx.program(vertex_shader=vertexShader, fragment_shader=fragmentShader)
+        program.set_uniform_array_safe('layerTextures', list(range(TEXTURE_LAYERS)))
+        return program
+
+    # typed arrays of TextureBuffer, written through the buffer protocol
+    def updateIndices(self, indices:array.array):
         indicesInBytes = len(indices) * 4
         if indicesInBytes != self.indices.size:
             self.indices.orphan(size=indicesInBytes)
-        self.indices.write(array.array('I', indices))
+        self.indices.write(indices)
         self.geometry.num_vertices = len(indices)
 
-    def updateVerts(self, verts:List[float]):
+    def updateVerts(self, verts:array.array):
         vertsInBytes = len(verts) * 4
         if vertsInBytes > self.verts.size:
             self.verts.orphan(size=vertsInBytes)
-        self.verts.write(array.array('f', verts))
+        self.verts.write(verts)
 
-    def updateUVs(self, uvs:List[float]):
+    def updateUVs(self, uvs:array.array):
         uvsInBytes = len(uvs) * 4
         if uvsInBytes > self.uvs.size:
             self.uvs.orphan(size=uvsInBytes)
-        self.uvs.write(array.array('f', uvs))
+        self.uvs.write(uvs)
+
+    def updateLayers(self, layers:array.array):
+        layersInBytes = len(layers) * 4
+        if layersInBytes > self.layers.size:
+            self.layers.orphan(size=layersInBytes)
+        self.layers.write(layers)
 
-    def update(self, verts:List[float], uvs:List[float], indices:List[int]):
+    def update(self, verts:array.array, uvs:array.array, indices:array.array):
         vertsInBytes = len(verts) * 4
         uvsInBytes = len(uvs) * 4
         indicesInBytes = len(indices) * 4
 
         if vertsInBytes > self.verts.size:
             self.verts.orphan(size=vertsInBytes)
-        self.verts.write(array.array('f', verts))
+        self.verts.write(verts)
         
         if uvsInBytes > self.uvs.size:
             self.uvs.orphan(size=uvsInBytes)
-        self.uvs.write(array.array('f', uvs))
+        self.uvs.write(uvs)
         
         if indicesInBytes != self.indices.size:
             self.indices.orphan(size=indicesInBytes)
             self.geometry.num_vertices = len(indices)
-        self.indices.write(array.array('I', indices))
+        self.indices.write(indices)
+
+    # one upload and one draw for the mappings of every channel, textures
+    # holds the channels and buffer.channels are the ones bound
+    def drawLayered(self, textures, buffer):
+        if not buffer.indices:
+            return
+        for channel in buffer.channels:
+            textures.use(channel, channel)
+        self.update(buffer.verts, buffer.uvs, buffer.indices)
+        self.updateLayers(buffer.layers)
+        self.draw()
 
     def draw(self):
         self.geometry.render(self.program)
\ No newline at end of file
@@ -0,0 +1,144 @@
+from array import array
+import hashlib
+
+from typing import Dict, List, Tuple
+
+Point = Tuple[float, float]
+
+EPSILON = 1e-12
+
+# geometry hash -> convex pieces, levels reuse the same outlines many times
+cache:Dict[bytes, List[List[Point]]] = {}
+cacheStats:Dict[str, int] = {'hits': 0, 'misses': 0}
+
+
+def geometryKey(points:List[Point]) -> bytes:
+    return hashlib.blake2b(array('d', [c for point in points for c in point]).tobytes(), digest_size=16).digest()
+
+
+def signedArea(points:List[Point]) -> float:
+    area = 0.0
+    for i in range(len(points)):
+        x1, y1 = points[i - 1]
+        x2, y2 = points[i]
+        area += x1 * y2 - x2 * y1
+    return area * 0.5
+
+
+def cross(o:Point, a:Point, b:Point) -> float:
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+# counter clockwise polygon without repeated or collinear vertices
+def isConvex(points:List[Point]) -> bool:
+    count = len(points)
+    return all(cross(points[i - 2], points[i - 1], points[i]) > EPSILON for i in range(count))
+
+
+def cleanOutline(points:List[Point]) -> List[Point]:
+    result:List[Point] = []
+    for point in points:
+        if not result or abs(point[0] - result[-1][0]) > EPSILON or abs(point[1] - result[-1][1]) > EPSILON:
+            result.append(point)
+    while len(result) > 1 and abs(result[0][0] - result[-1][0]) <= EPSILON and abs(result[0][1] - result[-1][1]) <= EPSILON:
+        result.pop()
+    if signedArea(result) < 0.0:
+        result.reverse()
+    changed = True
+    while changed and len(result) > 3:
+        changed = False
+        for i in range(len(result)):
+            if abs(cross(result[i - 1], result[i], result[(i + 1) % len(result)])) <= EPSILON:
+                del result[i]
+                changed = True
+                break
+    return result
+
+
+def inTriangle(p:Point, a:Point, b:Point, c:Point) -> bool:
+    return cross(a, b, p) >= -EPSILON and cross(b, c, p) >= -EPSILON and cross(c, a, p) >= -EPSILON
+
+
+# ear clipping, returns vertex index triangles or None for self intersecting outlines
+def triangulate(points:List[Point]) -> List[Tuple[int, int, int]]:
+    indices = list(range(len(points)))
+    triangles:List[Tuple[int, int, int]] = []
+    while len(indices) > 3:
+        count = len(indices)
+        for k in range(count):
+            i = indices[k - 1]
+            j = indices[k]
+            l = indices[(k + 1) % count]
+            a, b, c = points[i], points[j], points[l]
+            if cross(a, b, c) <= EPSILON:
+                continue
+            if any(inTriangle(points[m], a, b, c) for m in indices if m not in (i, j, l)):
+                continue
+            triangles.append((i, j, l))
+            del indices[k]
+            break
+        else:
+            return None
+    triangles.append(tuple(indices))
+    return triangles
+
+
+# Hertel-Mehlhorn, drops diagonals while the two pieces sharing them stay convex
+def mergeTriangles(points:List[Point], triangles:List[Tuple[int, int, int]]) -> List[List[int]]:
+    pieces:Dict[int, List[int]] = {i: list(triangle) for i, triangle in enumerate(triangles)}
+    owner:Dict[Tuple[int, int], int] = {}
+    for i, piece in pieces.items():
+        for k in range(3):
+            owner[(piece[k], piece[(k + 1) % 3])] = i
+    for u, v in list(owner):
+        a = owner.get((u, v))
+        b = owner.get((v, u))
+        if a is None or b is None or a == b:
+            continue
+        piece = mergePieces(pieces[a], pieces[b])
+        if piece and isConvex([points[i] for i in piece]):
+            second = pieces.pop(b)
+            for k in range(len(second)):
+                owner[(second[k], second[(k + 1) % len(second)])] = a
+            del owner[(u, v)], owner[(v, u)]
+            pieces[a] = piece
+    return list(pieces.values())
+
+
+def mergePieces(first:List[int], second:List[int]):
+    for i in range(len(first)):
+        u = first[i]
+        v = first[(i + 1) % len(first)]
+        # both pieces are counter clockwise, a shared edge runs the other way in the second one
+        for j in range(len(second)):
+            if second[j] == v and second[(j + 1) % len(second)] == u:
+                rest = [second[(j + 2 + k) % len(second)] for k in range(len(second) - 2)]
+                return first[:i + 1] + rest + first[i + 1:]
+    return None
+
+
+# splits a concave outline into convex pieces, convex and invalid outlines
+# are returned as they are so pymunk keeps taking their convex hull
+def decompose(points:List[Point]) -> List[List[Point]]:
+    points = [(float(x), float(y)) for x, y in points]
+    key = geometryKey(points)
+    pieces = cache.get(key)
+    if pieces is not None:
+        cacheStats['hits'] += 1
+        return pieces
+    cacheStats['misses'] += 1
+
+    outline = cleanOutline(points)
+    pieces = [points]
+    if len(outline) > 3 and not isConvex(outline):
+        triangles = triangulate(outline)
+        if triangles:
+            pieces = [[outline[i] for i in piece] for piece in mergeTriangles(outline, triangles)]
+    cache[key] = pieces
+    return pieces
+
+
+def clearCache():
+    cache.clear()
+    cacheStats['hits'] = 0
+    cacheStats['misses'] = 0
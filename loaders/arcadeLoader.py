@@ -1,9 +1,20 @@
 import arcade
 import pymunk
 from .pymunkLoader import PymunkLoader
+from .scenePrototype import ScenePrototype
+from .textureCache import TextureCache
 
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 import json
-from typing import Dict, List
+import logging
+import time
+from typing import Callable, Deque, Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 class ArcadeProxy:
     def __init__(self, sprite, body, pos:pymunk.Vec2d, angle:float):
@@ -16,47 +27,293 @@ class ArcadeProxy:
         self.sprite.radians = self.body.angle + self.dAngle
         self.sprite.position = self.body.position + self.dPos.rotated(self.body.angle)
 
+    def interpolate(self, previous:Tuple[float, float, float], alpha:float):
+        px, py, pAngle = previous
+        x, y = self.body.position
+        angle = pAngle + (self.body.angle - pAngle) * alpha
+        position = pymunk.Vec2d(px + (x - px) * alpha, py + (y - py) * alpha)
+        self.sprite.radians = angle + self.dAngle
+        self.sprite.position = position + self.dPos.rotated(angle)
+
+# runs on a worker thread: file read, JSON parse and image decoding only
+def decodeFile(path:str) -> ScenePrototype:
+    with open(path, 'r') as f:
+        prototype = ScenePrototype(json.loads(f.read()))
+    cache = TextureCache.getInstance()
+    for mapping in prototype.mappings.values():
+        cache.getImage(prototype.textures[mapping['textureChannel']]['path'])
+    return prototype
+
+
+def textureRect(textures:Dict, mapping:Dict) -> Tuple[int, int, int, int]:
+    textureSize = textures[mapping['textureChannel']]['size']
+    offset = mapping['offset']
+    size = mapping['size']
+    return offset[0], textureSize[1] - offset[1] - size[1], size[0], size[1]
+
+
+class LoadJob:
+    def __init__(self, path:str, offsetX:float, offsetY:float,
+                 onProgress:Callable[['LoadJob'], None]=None,
+                 onComplete:Callable[['LoadJob'], None]=None,
+                 onError:Callable[['LoadJob'], None]=None):
+        self.path = path
+        self.offsetX = offsetX
+        self.offsetY = offsetY
+        self.onProgress = onProgress
+        self.onComplete = onComplete
+        self.onError = onError
+        self.future:Future = None
+        self.steps:Deque[Callable[[], None]] = None
+        # bodies by label and constraints built by the job, see PymunkLoader.addObjects
+        self.objects:Tuple[Dict[str, pymunk.Body], List[pymunk.Constraint]] = None
+        self.total = 0
+        self.done = 0
+        self.completed = False
+        # set when decoding or a step raised, the job is dropped then
+        self.failed = False
+        self.error:Exception = None
+
+    # decoding on the worker counts as the first step
+    def progress(self) -> float:
+        if self.steps is None:
+            return 0.0
+        return (1 + self.done) / (1 + self.total)
+
+    def stepDone(self):
+        self.done += 1
+        if self.onProgress:
+            self.onProgress(self)
+
+
+LOG = logging.getLogger(__name__)
+
+# private arcade 2.6 (requirements.txt pins it) state sync writes directly
+SPRITE_SYNC_ARCADE = '2.6.'
+SPRITE_SYNC_VERSION = arcade.__version__.startswith(SPRITE_SYNC_ARCADE)
+if not SPRITE_SYNC_VERSION:
+    LOG.warning('arcade %s is not %sx, SpriteLoader.updateVectorized falls back to per sprite updates',
+                arcade.__version__, SPRITE_SYNC_ARCADE)
+SPRITE_LIST_ATTRIBUTES = ('sprite_slot', '_sprite_pos_data', '_sprite_angle_data',
+                          '_sprite_pos_changed', '_sprite_angle_changed')
+SPRITE_ATTRIBUTES = ('_position', '_angle', '_point_list_cache')
+
+
+# flat copies of proxy offsets, used to sync all sprites with a few numpy ops
+class ProxyArrays:
+    def __init__(self, proxies:List[ArcadeProxy], spriteList:arcade.SpriteList):
+        # other arcade versions lay sprites out differently, callers fall back to update
+        self.supported = SPRITE_SYNC_VERSION and \
+                         all(hasattr(spriteList, name) for name in SPRITE_LIST_ATTRIBUTES) and \
+                         all(hasattr(proxy.sprite, name) for proxy in proxies[:1] for name in SPRITE_ATTRIBUTES)
+        if not self.supported:
+            return
+        bodies:Dict[pymunk.Body, int] = {}
+        index = [bodies.setdefault(proxy.body, len(bodies)) for proxy in proxies]
+        self.bodies:List[pymunk.Body] = list(bodies)
+        self.sprites:List[arcade.Sprite] = [proxy.sprite for proxy in proxies]
+        self.bodyIndex = np.array(index, dtype=np.intp)
+        self.dx = np.array([proxy.dPos.x for proxy in proxies])
+        self.dy = np.array([proxy.dPos.y for proxy in proxies])
+        self.dAngle = np.array([proxy.dAngle for proxy in proxies])
+        self.slots = np.array([spriteList.sprite_slot[sprite] for sprite in self.sprites], dtype=np.intp)
+
+    def sync(self, spriteList:arcade.SpriteList):
+        state = np.array([(*body.position, body.angle) for body in self.bodies])[self.bodyIndex]
+        angle = state[:, 2]
+        cos = np.cos(angle)
+        sin = np.sin(angle)
+        x = state[:, 0] + cos * self.dx - sin * self.dy
+        y = state[:, 1] + sin * self.dx + cos * self.dy
+        degrees = np.degrees(angle + self.dAngle)
+
+        # views must not outlive this call, arcade may resize the arrays later
+        pos = np.frombuffer(spriteList._sprite_pos_data, dtype=np.float32)
+        pos[self.slots * 2] = x
+        pos[self.slots * 2 + 1] = y
+        angles = np.frombuffer(spriteList._sprite_angle_data, dtype=np.float32)
+        angles[self.slots] = degrees
+        del pos, angles
+        spriteList._sprite_pos_changed = True
+        spriteList._sprite_angle_changed = True
+
+        for sprite, sx, sy, sa in zip(self.sprites, x.tolist(), y.tolist(), degrees.tolist()):
+            sprite._position = (sx, sy)
+            sprite._angle = sa
+            sprite._point_list_cache = None
+
+
 class SpriteLoader(PymunkLoader):
+
+    PROFILED_PHASES = dict(PymunkLoader.PROFILED_PHASES,
+                           loadTexture='texture load',
+                           addSprite='sprite construction',
+                           prepareJob='async job setup')
+    # decodeFile on the worker thread, timed per job when profiling
+    ASYNC_DECODE_PHASE = 'async read and decode'
+
+    executor:ThreadPoolExecutor = None
+
     def __init__(self, space:pymunk.Space):
         super().__init__(space)
         self.proxy:List[ArcadeProxy] = []
+        self.jobs:List[LoadJob] = []
+        # sprites in a sprite list write position/angle into its buffers,
+        # lazy so the list can be filled before a GL context exists
+        self.spriteList = arcade.SpriteList(use_spatial_hash=False, lazy=True)
+        self.proxyArrays:ProxyArrays = None
+
+    @staticmethod
+    def getExecutor() -> ThreadPoolExecutor:
+        if SpriteLoader.executor is None:
+            SpriteLoader.executor = ThreadPoolExecutor(thread_name_prefix='SpriteLoader')
+        return SpriteLoader.executor
+
+    def loadFileAsync(self, path:str, offsetX:float=0.0, offsetY:float=0.0,
+                      onProgress:Callable[[LoadJob], None]=None,
+                      onComplete:Callable[[LoadJob], None]=None,
+                      onError:Callable[[LoadJob], None]=None) -> LoadJob:
+        job = LoadJob(path, offsetX, offsetY, onProgress, onComplete, onError)
+        decode = self.profiler.wrap(self.ASYNC_DECODE_PHASE, decodeFile) if self.profiler else decodeFile
+        job.future = SpriteLoader.getExecutor().submit(decode, path)
+        self.jobs.append(job)
+        return job
+
+    # main thread part of async loads, call once per frame. A job that raised
+    # is dropped and handed to its onError, without one the error is raised
+    # here once. Objects a failed job already built stay out of the space
+    def poll(self, budget:float=0.004):
+        deadline = time.perf_counter() + budget
+        failed:List[LoadJob] = []
+        for job in self.jobs:
+            try:
+                if job.steps is None:
+                    if not job.future.done():
+                        continue
+                    self.prepareJob(job)
+                while job.steps and time.perf_counter() < deadline:
+                    job.steps.popleft()()
+                    job.stepDone()
+            except Exception as e:
+                job.failed = True
+                job.error = e
+                failed.append(job)
+                continue
+            if not job.steps:
+                job.completed = True
+                if job.onComplete:
+                    job.onComplete(job)
+            if time.perf_counter() >= deadline:
+                break
+        self.jobs = [job for job in self.jobs if not job.completed and not job.failed]
+        for job in failed:
+            if job.onError:
+                job.onError(job)
+        for job in failed:
+            if not job.onError:
+                raise job.error
+
+    def prepareJob(self, job:LoadJob):
+        # re-raises errors from the worker thread
+        prototype = job.future.result()
+        steps:Deque[Callable[[], None]] = deque()
+
+        # physics only, the sprites are steps of their own
+        def build():
+            job.objects = self.buildPrototype(prototype, job.offsetX, job.offsetY)
+
+        steps.append(build)
+        for mapping in prototype.mappings.values():
+            steps.append(lambda mapping=mapping: self.loadSprite(prototype.textures, mapping))
+        # only what this job built, the loader may already hold added objects
+        steps.append(lambda: self.addObjects(*job.objects))
+        job.steps = steps
+        job.total = len(steps)
 
     def loadFile(self, path:str, offsetX:float=0.0, offsetY:float=0.0):
-        data = None
-        obj = None
-        with open(path, 'r') as f:
-            data = f.read()
+        data = self.readFile(path)
         if data:
-            obj = json.loads(data)
+            obj = self.decodeData(data)
             super().loadData(obj, offsetX, offsetY)
             self.loadData(obj)
 
+    def loadPrototype(self, prototype:ScenePrototype, offsetX:float=0.0, offsetY:float=0.0, angle:float=0.0):
+        objects = super().loadPrototype(prototype, offsetX, offsetY, angle)
+        self.loadSprites(prototype.textures, prototype.mappings)
+        return objects
+
+    def loadBinaryFile(self, path:str, offsetX:float=0.0, offsetY:float=0.0):
+        scene = super().loadBinaryFile(path, offsetX, offsetY)
+        self.loadSprites(scene.getTexturesDict(), scene.getMappingsDict())
+        return scene
+
     def loadData(self, obj:Dict):
         self.loadSprites(obj['Textures'], obj['Mappings'])
 
     def loadSprites(self,textures, mappings):     
-        for label, mapping in mappings.items():
-            channel = mapping['textureChannel']
-            texturePath = textures[channel]['path']
-            textureSize = textures[channel]['size']
-            offset = mapping['offset']
-            size = mapping['size']
-            currentTexture = arcade.load_texture(texturePath, offset[0], textureSize[1] - offset[1] - size[1], size[0], size[1])
-            sprite = arcade.Sprite(texture = currentTexture)
-            sprite.scale = mapping['subScale']
-            body = self.bodies[mapping['body']]
-            rot = mapping['subRotate']
-            anchor = mapping['subAnchor']
-            self.proxy.append(ArcadeProxy(sprite, body, pymunk.Vec2d(anchor[0], anchor[1]), rot))
+        for mapping in mappings.values():
+            self.loadSprite(textures, mapping)
+
+    def loadSprite(self, textures:Dict, mapping:Dict):
+        self.addSprite(mapping, self.loadTexture(textures, mapping))
+
+    def loadTexture(self, textures:Dict, mapping:Dict) -> arcade.Texture:
+        texturePath = textures[mapping['textureChannel']]['path']
+        return TextureCache.getInstance().acquire(texturePath, *textureRect(textures, mapping))
+
+    def addSprite(self, mapping:Dict, texture:arcade.Texture):
+        sprite = arcade.Sprite(texture = texture)
+        sprite.scale = mapping['subScale']
+        body = self.bodies[mapping['body']]
+        rot = mapping['subRotate']
+        anchor = mapping['subAnchor']
+        self.proxy.append(ArcadeProxy(sprite, body, pymunk.Vec2d(anchor[0], anchor[1]), rot))
+        self.spriteList.append(sprite)
+        self.proxyArrays = None
+
+    # drops sprites and proxies, textures go back to the cache. The physics
+    # objects go to the prototype pool if there is one, see PymunkLoader.unload
+    def unload(self):
+        cache = TextureCache.getInstance()
+        for proxy in self.proxy:
+            cache.release(proxy.sprite.texture)
+        self.proxy.clear()
+        self.spriteList.clear()
+        self.proxyArrays = None
+        self.previousTransforms = {}
+        super().unload()
+
+    # sprites are built again for the pooled bodies
+    def reuseInstance(self, prototype:ScenePrototype, offsetX:float=0.0, offsetY:float=0.0, angle:float=0.0):
+        super().reuseInstance(prototype, offsetX, offsetY, angle)
+        self.loadSprites(prototype.textures, prototype.mappings)
 
     def update(self):
         for proxy in self.proxy:
             #proxy.body.angle += 0.01
             proxy.update()
 
-    def draw(self):
+    def interpolate(self, alpha:float):
+        previous = self.previousTransforms
         for proxy in self.proxy:
-            proxy.sprite.draw()
+            if proxy.body in previous:
+                proxy.interpolate(previous[proxy.body], alpha)
+            else:
+                proxy.update()
+
+    def updateVectorized(self):
+        if np is None or not self.proxy:
+            self.update()
+            return
+        if self.proxyArrays is None:
+            self.proxyArrays = ProxyArrays(self.proxy, self.spriteList)
+        if not self.proxyArrays.supported:
+            self.update()
+            return
+        self.proxyArrays.sync(self.spriteList)
+
+    def draw(self):
+        self.spriteList.draw()
     
     def debug(self):
         for proxy in self.proxy:
@@ -0,0 +1,133 @@
+import numpy as np
+import pymunk
+
+from .pymunkLoader import PymunkLoader
+from .loaderSnapshot import restoreSnapshots
+
+import argparse
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+import queue
+import time
+from typing import Callable, List, Tuple
+
+# per body and step: x, y, angle, velocity x, velocity y, angular velocity
+STATE_SIZE = 6
+
+
+def createSpace(gravity:Tuple[float, float]) -> pymunk.Space:
+    space = pymunk.Space()
+    space.gravity = gravity
+    return space
+
+
+def loadScenes(scenes:List[Tuple[str, float, float]], gravity:Tuple[float, float]):
+    space = createSpace(gravity)
+    loaders:List[PymunkLoader] = []
+    for path, offsetX, offsetY in scenes:
+        loader = PymunkLoader(space)
+        loader.loadFile(path)
+        loader.move(offsetX, offsetY)
+        loader.addAll()
+        loaders.append(loader)
+    return space, loaders
+
+
+def worker(scenes, gravity, dt:float, steps:int, episodes:List[int], shmName:str, shape:Tuple,
+           setup:Callable, control:Callable, done):
+    space, loaders = loadScenes(scenes, gravity)
+    bodies = [body for loader in loaders for body in loader.bodies.values()]
+    initial = [loader.snapshot() for loader in loaders]
+
+    shm = shared_memory.SharedMemory(name=shmName)
+    try:
+        out = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        states = None
+        for episode in episodes:
+            # every episode starts in a fresh space without the solver caches of
+            # the previous one, see loaderSnapshot.restoreSnapshots
+            space = createSpace(gravity)
+            restoreSnapshots(loaders, initial, resetSolver=True, space=space)
+            if setup:
+                setup(loaders, episode)
+            states = out[episode]
+            for step in range(steps):
+                if control:
+                    control(loaders, episode, step)
+                space.step(dt)
+                states[step] = [(*body.position, body.angle, *body.velocity, body.angular_velocity) for body in bodies]
+            done.put(episode)
+        del out, states
+    finally:
+        shm.close()
+
+
+# runs independent episodes of the same scenes on a process pool, every
+# worker loads the scenes once and resets them from a snapshot per episode,
+# the same snapshot gives the same episode on any worker
+class BatchSimulator:
+    def __init__(self, scenes:List[Tuple[str, float, float]], steps:int, dt:float=1.0 / 60.0,
+                 gravity:Tuple[float, float]=(0.0, -9.81), workers:int=None,
+                 setup:Callable=None, control:Callable=None):
+        self.scenes = scenes
+        self.steps = steps
+        self.dt = dt
+        self.gravity = gravity
+        self.workers = workers or os.cpu_count()
+        # module level functions, they are sent to the worker processes
+        self.setup = setup
+        self.control = control
+        _, loaders = loadScenes(scenes, gravity)
+        self.bodyLabels:List[str] = [f'{i}/{label}' for i, loader in enumerate(loaders) for label in loader.bodies]
+
+    def run(self, episodes:int, onEpisode:Callable[[int, np.ndarray], None]=None) -> np.ndarray:
+        shape = (episodes, self.steps, len(self.bodyLabels), STATE_SIZE)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 8))
+        try:
+            out = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+            ctx = multiprocessing.get_context()
+            done = ctx.Queue()
+            workers = min(self.workers, episodes)
+            processes = [ctx.Process(target=worker,
+                                     args=(self.scenes, self.gravity, self.dt, self.steps,
+                                           list(range(i, episodes, workers)), shm.name, shape,
+                                           self.setup, self.control, done))
+                         for i in range(workers)]
+            for process in processes:
+                process.start()
+            finished = 0
+            while finished < episodes:
+                try:
+                    episode = done.get(timeout=1.0)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes) and done.empty():
+                        raise RuntimeError(f'workers exited after {finished} of {episodes} episodes')
+                    continue
+                finished += 1
+                if onEpisode:
+                    onEpisode(episode, out[episode])
+            for process in processes:
+                process.join()
+            result = out.copy()
+            del out
+        finally:
+            shm.close()
+            shm.unlink()
+        return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run independent episodes of exported scenes on a process pool.')
+    parser.add_argument('scenes', nargs='*', default=['data/states/level.json', 'data/states/car1.json'])
+    parser.add_argument('--episodes', type=int, default=64)
+    parser.add_argument('--steps', type=int, default=600)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    simulator = BatchSimulator([(scene, 0.0, 0.0) for scene in args.scenes], args.steps, workers=args.workers)
+    start = time.perf_counter()
+    simulator.run(args.episodes)
+    duration = time.perf_counter() - start
+    print(f'{args.episodes} episodes x {args.steps} steps on {args.workers} workers: {duration:.3f} s, '
+          f'{args.episodes * args.steps / duration:.0f} steps/s')
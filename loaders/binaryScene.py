@@ -0,0 +1,305 @@
+from array import array
+import json
+import mmap
+import struct
+import sys
+
+from typing import Dict, List, Tuple
+
+# Precompiled scene layout (little endian):
+#   header
+#   string index  : (start, length) pairs into string data
+#   string data   : utf-8 blob
+#   bodies        : BODY records, shapes of a body are stored contiguously
+#   shapes        : SHAPE records
+#   floats        : f64 array with polygon/line points and mapping quads
+#   constraints   : CONSTRAINT records, bodies referenced by index
+#   mappings      : MAPPING records
+#   textures      : TEXTURE records
+
+MAGIC = b'PMKB'
+FORMAT_VERSION = 1
+
+SECTIONS = ('stringIndex', 'stringData', 'bodies', 'shapes', 'floats', 'constraints', 'mappings', 'textures')
+
+HEADER = struct.Struct('<4sHHI' + 'II' * len(SECTIONS))
+STRING = struct.Struct('<II')
+BODY = struct.Struct('<IBBxxddddII')
+SHAPE = struct.Struct('<IBBxxIIIIIddddddd')
+CONSTRAINT_PARAMS_COUNT = 7
+CONSTRAINT = struct.Struct('<IBBxxIIddd' + 'd' * CONSTRAINT_PARAMS_COUNT)
+MAPPING = struct.Struct('<IIIiiiiddddddI')
+TEXTURE = struct.Struct('<IIII')
+
+BODY_TYPES = ('Dynamic', 'Kinematic', 'Static')
+
+BODY_CUSTOM_MASS = 1
+BODY_CUSTOM_MOMENT = 2
+BODY_CUSTOM_COG = 4
+
+SHAPE_POLYGON = 0
+SHAPE_CIRCLE = 1
+SHAPE_LINE = 2
+SHAPE_TYPES = {'Polygon': SHAPE_POLYGON,
+               'Box': SHAPE_POLYGON,
+               'Rect': SHAPE_POLYGON,
+               'Circle': SHAPE_CIRCLE,
+               'Line': SHAPE_LINE}
+
+SHAPE_CUSTOM_MASS = 1
+SHAPE_SENSOR = 2
+
+CONSTRAINT_SELF_COLLIDE = 1
+
+# order of parameters stored per constraint type, 2d vectors take two slots
+CONSTRAINT_TYPES: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ('Rotary Spring', ('restAngle', 'stiffness', 'damping')),
+    ('Damped Spring', ('anchorA', 'anchorB', 'restLength', 'stiffness', 'damping')),
+    ('Gear', ('phase', 'ratio')),
+    ('Groove', ('grooveA', 'grooveB', 'anchorB')),
+    ('Pin', ('anchorA', 'anchorB')),
+    ('Pivot', ('anchorA', 'anchorB')),
+    ('Ratchet', ('phase', 'ratchet')),
+    ('Rotary Limit', ('min', 'max')),
+    ('Motor', ('rate',)),
+    ('Slide', ('anchorA', 'anchorB', 'min', 'max')),
+)
+CONSTRAINT_KINDS = {name: kind for kind, (name, _) in enumerate(CONSTRAINT_TYPES)}
+
+MAPPING_FLOATS = 16
+
+
+class StringTable:
+    def __init__(self):
+        self.index:Dict[str, int] = {}
+        self.strings:List[str] = []
+
+    def get(self, value:str) -> int:
+        if value not in self.index:
+            self.index[value] = len(self.strings)
+            self.strings.append(value)
+        return self.index[value]
+
+
+def compileScene(obj:Dict) -> bytes:
+    strings = StringTable()
+    floats = array('d')
+    bodies = bytearray()
+    shapes = bytearray()
+    constraints = bytearray()
+    mappings = bytearray()
+    textures = bytearray()
+
+    bodyIndex:Dict[str, int] = {}
+    shapeCount = 0
+    for label, body in obj['Bodies'].items():
+        bodyIndex[label] = len(bodyIndex)
+        firstShape = shapeCount
+        for sLabel, shape in body['shapes'].items():
+            shapes += compileShape(shape, strings.get(sLabel), floats)
+            shapeCount += 1
+        physics = body['physics']
+        flags = ((BODY_CUSTOM_MASS if physics['hasCustomMass'] else 0) |
+                 (BODY_CUSTOM_MOMENT if physics['hasCustomMoment'] else 0) |
+                 (BODY_CUSTOM_COG if physics['hasCustomCog'] else 0))
+        typ = BODY_TYPES.index(body['type']) if body['type'] in BODY_TYPES else BODY_TYPES.index('Static')
+        bodies += BODY.pack(strings.get(label), typ, flags,
+                            physics['customMass'], physics['customMoment'],
+                            physics['cog'][0], physics['cog'][1],
+                            firstShape, shapeCount - firstShape)
+
+    for label, constraint in obj['Constraints'].items():
+        if constraint['type'] not in CONSTRAINT_KINDS:
+            continue
+        kind = CONSTRAINT_KINDS[constraint['type']]
+        params = []
+        for key in CONSTRAINT_TYPES[kind][1]:
+            value = constraint[key]
+            if isinstance(value, (list, tuple)):
+                params.extend(value)
+            else:
+                params.append(value)
+        params.extend([0.0] * (CONSTRAINT_PARAMS_COUNT - len(params)))
+        flags = CONSTRAINT_SELF_COLLIDE if constraint.get('selfCollide', False) else 0
+        constraints += CONSTRAINT.pack(strings.get(label), kind, flags,
+                                       bodyIndex[constraint['bodyA']], bodyIndex[constraint['bodyB']],
+                                       constraint.get('maxBias', float("inf")),
+                                       constraint.get('errorBias', pow(0.9, 60)),
+                                       constraint.get('maxForce', float("inf")),
+                                       *params)
+
+    for label, mapping in obj.get('Mappings', {}).items():
+        firstFloat = len(floats)
+        floats.extend(mapping.get('GLmapping', [0.0] * 8))
+        floats.extend(mapping.get('GLuv', [0.0] * 8))
+        mappings += MAPPING.pack(strings.get(label), strings.get(mapping['textureChannel']),
+                                 strings.get(mapping['body']),
+                                 int(mapping['offset'][0]), int(mapping['offset'][1]),
+                                 int(mapping['size'][0]), int(mapping['size'][1]),
+                                 mapping['subAnchor'][0], mapping['subAnchor'][1],
+                                 mapping['subScale'], mapping['subRotate'],
+                                 mapping['anchor'][0], mapping['anchor'][1],
+                                 firstFloat)
+
+    for channel, texture in obj.get('Textures', {}).items():
+        textures += TEXTURE.pack(strings.get(channel), strings.get(texture['path']),
+                                 int(texture['size'][0]), int(texture['size'][1]))
+
+    version = strings.get(obj.get('Version', ''))
+
+    stringIndex = bytearray()
+    stringData = bytearray()
+    for value in strings.strings:
+        encoded = value.encode('utf-8')
+        stringIndex += STRING.pack(len(stringData), len(encoded))
+        stringData += encoded
+
+    if sys.byteorder != 'little':
+        floats.byteswap()
+
+    sections = ((stringIndex, len(strings.strings)),
+                (stringData, len(stringData)),
+                (bodies, len(bodyIndex)),
+                (shapes, shapeCount),
+                (floats.tobytes(), len(floats)),
+                (constraints, len(constraints) // CONSTRAINT.size),
+                (mappings, len(mappings) // MAPPING.size),
+                (textures, len(textures) // TEXTURE.size))
+
+    table = []
+    offset = HEADER.size
+    for data, count in sections:
+        table.extend((offset, count))
+        offset += len(data)
+
+    out = bytearray(HEADER.pack(MAGIC, FORMAT_VERSION, 0, version, *table))
+    for data, _ in sections:
+        out += data
+    return bytes(out)
+
+
+def compileShape(shape:Dict, label:int, floats:array) -> bytes:
+    kind = SHAPE_TYPES[shape['type']]
+    physics:Dict = shape['physics']
+    internal:Dict = shape['internal']
+    flags = ((SHAPE_CUSTOM_MASS if physics['hasCustomMass'] else 0) |
+             (SHAPE_SENSOR if physics.get('isSensor', False) else 0))
+    firstFloat = len(floats)
+    offset = (0.0, 0.0)
+    if kind == SHAPE_CIRCLE:
+        offset = internal['offset']
+    else:
+        for point in internal['points']:
+            floats.extend(point)
+    return SHAPE.pack(label, kind, flags,
+                      physics.get('filterGroup', 0),
+                      physics.get('filterCategory', 0xFFFFFFFF),
+                      physics.get('filterMask', 0xFFFFFFFF),
+                      firstFloat, len(floats) - firstFloat,
+                      internal['radius'], offset[0], offset[1],
+                      physics.get('elasticity', 0.0),
+                      physics.get('friction', 1.0),
+                      physics['customMass'],
+                      physics['customDensity'])
+
+
+def compileFile(jsonPath:str, binaryPath:str):
+    with open(jsonPath, 'r') as f:
+        obj = json.loads(f.read())
+    with open(binaryPath, 'wb') as f:
+        f.write(compileScene(obj))
+
+
+class BinaryScene:
+    def __init__(self, data):
+        header = HEADER.unpack_from(data, 0)
+        if header[0] != MAGIC:
+            raise ValueError('not a precompiled scene')
+        if header[1] != FORMAT_VERSION:
+            raise ValueError(f'unsupported scene format version {header[1]}')
+        table = header[4:]
+        sections = {name: (table[2 * i], table[2 * i + 1]) for i, name in enumerate(SECTIONS)}
+
+        view = memoryview(data)
+        try:
+            start, count = sections['stringIndex']
+            dataStart = sections['stringData'][0]
+            self.strings:List[str] = [str(view[dataStart + s: dataStart + s + n], 'utf-8')
+                                      for s, n in STRING.iter_unpack(view[start: start + count * STRING.size])]
+            self.version = self.strings[header[3]]
+            self.bodies = self.records(view, sections['bodies'], BODY)
+            self.shapes = self.records(view, sections['shapes'], SHAPE)
+            self.constraints = self.records(view, sections['constraints'], CONSTRAINT)
+            self.mappings = self.records(view, sections['mappings'], MAPPING)
+            self.textures = self.records(view, sections['textures'], TEXTURE)
+            start, count = sections['floats']
+            self.floats = array('d')
+            self.floats.frombytes(view[start: start + count * self.floats.itemsize])
+            if sys.byteorder != 'little':
+                self.floats.byteswap()
+        finally:
+            view.release()
+
+    @staticmethod
+    def records(view:memoryview, section:Tuple[int, int], record:struct.Struct) -> List[Tuple]:
+        start, count = section
+        return list(record.iter_unpack(view[start: start + count * record.size]))
+
+    @staticmethod
+    def loadFile(path:str) -> 'BinaryScene':
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return BinaryScene(mm)
+
+    # a SHAPE record as the exported shape dict, for PymunkLoader.loadShape.
+    # Box and Rect come back as Polygon, exported convex pieces are not stored
+    def getShapeDict(self, record:Tuple) -> Dict:
+        (_, kind, flags, filterGroup, filterCategory, filterMask, first, count,
+         radius, offX, offY, elasticity, friction, mass, density) = record
+        floats = self.floats
+        physics = {'elasticity': elasticity,
+                   'friction': friction,
+                   'isSensor': bool(flags & SHAPE_SENSOR),
+                   'filterGroup': filterGroup,
+                   'filterCategory': filterCategory,
+                   'filterMask': filterMask,
+                   'hasCustomMass': bool(flags & SHAPE_CUSTOM_MASS),
+                   'customMass': mass,
+                   'customDensity': density}
+        if kind == SHAPE_CIRCLE:
+            return {'type': 'Circle', 'physics': physics, 'internal': {'radius': radius, 'offset': [offX, offY]}}
+        if kind == SHAPE_LINE:
+            points = [list(floats[i: i + 4]) for i in range(first, first + count, 4)]
+            return {'type': 'Line', 'physics': physics, 'internal': {'radius': radius, 'points': points}}
+        points = [list(floats[i: i + 2]) for i in range(first, first + count, 2)]
+        return {'type': 'Polygon', 'physics': physics, 'internal': {'radius': radius, 'points': points}}
+
+    def getTexturesDict(self) -> Dict:
+        strings = self.strings
+        return {strings[channel]: {'path': strings[path], 'size': [width, height]}
+                for channel, path, width, height in self.textures}
+
+    def getMappingsDict(self) -> Dict:
+        strings = self.strings
+        floats = self.floats
+        mappings = {}
+        for (label, channel, body, offX, offY, width, height,
+             anchorX, anchorY, scale, rotate, texAnchorX, texAnchorY, first) in self.mappings:
+            mappings[strings[label]] = {'textureChannel': strings[channel],
+                                        'body': strings[body],
+                                        'offset': [offX, offY],
+                                        'size': [width, height],
+                                        'anchor': [texAnchorX, texAnchorY],
+                                        'subAnchor': [anchorX, anchorY],
+                                        'subScale': scale,
+                                        'subRotate': rotate,
+                                        'GLmapping': floats[first: first + 8].tolist(),
+                                        'GLuv': floats[first + 8: first + MAPPING_FLOATS].tolist()}
+        return mappings
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print(f'usage: {sys.argv[0]} scene.json scene.pmb')
+        sys.exit(1)
+    compileFile(sys.argv[1], sys.argv[2])
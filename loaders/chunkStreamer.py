@@ -0,0 +1,69 @@
+import pymunk
+
+from typing import Dict, List, Set, Tuple
+import math
+
+
+class ChunkStreamer:
+    def __init__(self, space:pymunk.Space, chunkSize:float=20.0, radius:int=1):
+        self.space = space
+        self.chunkSize = chunkSize
+        self.radius = radius
+        self.chunks:Dict[Tuple[int, int], List[pymunk.Shape]] = {}
+        self.shapeChunks:Dict[pymunk.Shape, List[Tuple[int, int]]] = {}
+        self.activeChunks:Set[Tuple[int, int]] = set()
+        self.activeShapes:Set[pymunk.Shape] = set()
+        self.focus:Tuple[int, int] = None
+
+    def chunkOf(self, x:float, y:float) -> Tuple[int, int]:
+        return (math.floor(x / self.chunkSize), math.floor(y / self.chunkSize))
+
+    # shape is registered in every chunk its bounding box overlaps
+    def addShape(self, shape:pymunk.Shape):
+        bb = shape.cache_bb()
+        left, bottom = self.chunkOf(bb.left, bb.bottom)
+        right, top = self.chunkOf(bb.right, bb.top)
+        keys = [(x, y) for x in range(left, right + 1) for y in range(bottom, top + 1)]
+        self.shapeChunks[shape] = keys
+        for key in keys:
+            self.chunks.setdefault(key, []).append(shape)
+        if any(key in self.activeChunks for key in keys):
+            self.activeShapes.add(shape)
+            self.space.add(shape)
+
+    # forgets every registered shape, active ones must be removed from the space by the caller
+    def clear(self):
+        self.chunks.clear()
+        self.shapeChunks.clear()
+        self.activeChunks.clear()
+        self.activeShapes.clear()
+        self.focus = None
+
+    def updateFocus(self, x:float, y:float):
+        self.setFocus(self.chunkOf(x, y))
+
+    def setFocus(self, focus:Tuple[int, int]):
+        if focus == self.focus:
+            return
+        self.focus = focus
+        r = self.radius
+        active = {(focus[0] + dx, focus[1] + dy) for dx in range(-r, r + 1) for dy in range(-r, r + 1)}
+
+        toRemove = []
+        for key in self.activeChunks - active:
+            for shape in self.chunks.get(key, ()):
+                if shape in self.activeShapes and not any(k in active for k in self.shapeChunks[shape]):
+                    self.activeShapes.discard(shape)
+                    toRemove.append(shape)
+        toAdd = []
+        for key in active - self.activeChunks:
+            for shape in self.chunks.get(key, ()):
+                if shape not in self.activeShapes:
+                    self.activeShapes.add(shape)
+                    toAdd.append(shape)
+
+        self.activeChunks = active
+        if toRemove:
+            self.space.remove(*toRemove)
+        if toAdd:
+            self.space.add(*toAdd)
@@ -0,0 +1,60 @@
+import pymunk
+
+from typing import Callable, List
+
+
+# steps the space with a constant dt, renders loaders interpolated between the
+# last two steps. Loaders that draw implement interpolate(alpha), alpha in [0, 1)
+class FixedStepRunner:
+    def __init__(self, space:pymunk.Space, dt:float=1.0 / 60.0, substeps:int=1, maxSteps:int=5):
+        self.space = space
+        self.dt = dt
+        self.substeps = substeps
+        self.maxSteps = maxSteps
+        self.timeScale = 1.0
+        self.loaders:List = []
+        # the ones with interpolate, the others only get stepped
+        self.rendered:List = []
+        # called with dt before every fixed step, e.g. to apply input
+        self.beforeStep:Callable[[float], None] = None
+        self.accumulator = 0.0
+        self.alpha = 0.0
+        self.droppedTime = 0.0
+        self.steps = 0
+
+    def addLoader(self, loader):
+        self.loaders.append(loader)
+        if hasattr(loader, 'interpolate'):
+            self.rendered.append(loader)
+
+    def removeLoader(self, loader):
+        self.loaders.remove(loader)
+        if loader in self.rendered:
+            self.rendered.remove(loader)
+
+    def update(self, frameTime:float) -> int:
+        dt = self.dt
+        subDt = dt / self.substeps
+        self.accumulator += frameTime * self.timeScale
+        steps = 0
+        while self.accumulator >= dt and steps < self.maxSteps:
+            for loader in self.rendered:
+                loader.storeTransforms()
+            if self.beforeStep:
+                self.beforeStep(dt)
+            for _ in range(self.substeps):
+                self.space.step(subDt)
+            self.accumulator -= dt
+            steps += 1
+
+        # catching up is capped, the remaining whole steps are dropped
+        if self.accumulator >= dt:
+            dropped = self.accumulator - self.accumulator % dt
+            self.droppedTime += dropped
+            self.accumulator -= dropped
+
+        self.steps += steps
+        self.alpha = self.accumulator / dt
+        for loader in self.rendered:
+            loader.interpolate(self.alpha)
+        return steps
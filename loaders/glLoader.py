@@ -1,70 +1,193 @@
 import arcade
-from arcade.gl import Texture
+from arcade.gl import BufferDescription, Texture
 
 import pymunk
 from .pymunkLoader import PymunkLoader
 
-import json
-from typing import Dict, List
+import array
+import math
+from typing import Dict, List, Tuple
+
+
+class GLBatch:
+    # static per instance data: mapping quad (4 corners, body space) and its uvs
+    # dynamic per instance: body x, y, cos(angle), sin(angle)
+    TRANSFORM_FLOATS = 4
+
+    def __init__(self, texture:Texture):
+        self.texture = texture
+        self.static = array.array('f')
+        self.transforms = array.array('f')
+        self.count = 0
+        self.geometry = None
+        self.transformBuffer = None
+
+    def add(self, quad:List[float], uvs:List[float]) -> int:
+        self.static.extend(quad)
+        self.static.extend(uvs)
+        self.transforms.extend((0.0, 0.0, 1.0, 0.0))
+        self.geometry = None
+        self.count += 1
+        return self.count - 1
+
+    def build(self, ctx):
+        corners = ctx.buffer(data=array.array('f', [0.0, 1.0, 2.0, 3.0]), usage='static')
+        static = ctx.buffer(data=self.static, usage='static')
+        self.transformBuffer = ctx.buffer(data=self.transforms, usage='stream')
+        self.geometry = ctx.geometry([BufferDescription(corners, '1f', ['inCorner']),
+                                      BufferDescription(static, '4f 4f 4f 4f', ['inQuadA', 'inQuadB', 'inUVA', 'inUVB'], instanced=True),
+                                      BufferDescription(self.transformBuffer, '4f', ['inTransform'], instanced=True)],
+                                     mode=ctx.TRIANGLE_STRIP)
+
+    def draw(self, ctx, program):
+        if self.count == 0:
+            return
+        if self.geometry is None:
+            self.build(ctx)
+        else:
+            self.transformBuffer.write(self.transforms)
+        self.texture.use(0)
+        self.geometry.render(program, vertices=4, instances=self.count)
 
 
 class GLProxy:
-    def __init__(self, arrayIndex:int, body, pos:pymunk.Vec2d, angle:float):
+    def __init__(self, arrayIndex:int, body, transforms:array.array):
         self.arrayIndex = arrayIndex
         self.body:pymunk.Body = body
-        self.dPos = pos
-        self.dAngle = angle
+        self.transforms = transforms
 
     def update(self):
-        radians = self.body.angle + self.dAngle
-        position = self.body.position + self.dPos.rotated(self.body.angle)
+        angle = self.body.angle
+        x, y = self.body.position
+        transforms = self.transforms
+        i = self.arrayIndex * GLBatch.TRANSFORM_FLOATS
+        transforms[i] = x
+        transforms[i + 1] = y
+        transforms[i + 2] = math.cos(angle)
+        transforms[i + 3] = math.sin(angle)
+
+    def interpolate(self, previous:Tuple[float, float, float], alpha:float):
+        px, py, pAngle = previous
+        x, y = self.body.position
+        angle = pAngle + (self.body.angle - pAngle) * alpha
+        transforms = self.transforms
+        i = self.arrayIndex * GLBatch.TRANSFORM_FLOATS
+        transforms[i] = px + (x - px) * alpha
+        transforms[i + 1] = py + (y - py) * alpha
+        transforms[i + 2] = math.cos(angle)
+        transforms[i + 3] = math.sin(angle)
 
 
 class GLLoader(PymunkLoader):
+    program = None
+
+    PROFILED_PHASES = dict(PymunkLoader.PROFILED_PHASES,
+                           loadTexture='texture load',
+                           addInstance='instance construction')
+
     def __init__(self, space:pymunk.Space):
         super().__init__(space)
         self.proxy:List[GLProxy] = []
         self.textures : Dict[str, Texture] = {}
+        self.batches : Dict[str, GLBatch] = {}
+        self.ctx = arcade.get_window().ctx
+
+    @staticmethod
+    def getProgram(ctx):
+        if GLLoader.program is None:
+            vertexShader="""
+                #version 330
+
+                uniform Projection {
+                    uniform mat4 matrix;
+                } proj;
+
+                in float inCorner;
+                in vec4 inQuadA;
+                in vec4 inQuadB;
+                in vec4 inUVA;
+                in vec4 inUVB;
+                in vec4 inTransform;
+
+                out vec2 fUV;
 
-    def loadFile(self, path:str):
-        data = None
-        obj = None
-        with open(path, 'r') as f:
-            data = f.read()
+                void main() {
+                    int corner = int(inCorner);
+                    vec4 quad = corner < 2 ? inQuadA : inQuadB;
+                    vec4 uv = corner < 2 ? inUVA : inUVB;
+                    vec2 local = (corner % 2 == 0) ? quad.xy : quad.zw;
+                    fUV = (corner % 2 == 0) ? uv.xy : uv.zw;
+                    vec2 world = inTransform.xy + vec2(inTransform.z * local.x - inTransform.w * local.y,
+                                                       inTransform.w * local.x + inTransform.z * local.y);
+                    gl_Position = proj.matrix * vec4(world, 0.0, 1.0);
+                }
+                """
+
+            fragmentShader="""
+                #version 330
+
+                in vec2 fUV;
+
+                uniform sampler2D currentTexture;
+
+                out vec4 fragColor;
+
+                void main() {
+                    fragColor = texture(currentTexture, fUV);
+                }
+                """
+            GLLoader.program = ctx.program(vertex_shader=vertexShader, fragment_shader=fragmentShader)
+            GLLoader.program.set_uniform_safe('currentTexture', 0)
+        return GLLoader.program
+
+    def loadFile(self, path:str, offsetX:float=0.0, offsetY:float=0.0):
+        data = self.readFile(path)
         if data:
-            obj = json.loads(data)
-            super().loadData(obj)
+            obj = self.decodeData(data)
+            super().loadData(obj, offsetX, offsetY)
             self.loadData(obj)
 
     def loadData(self, obj:Dict):
         self.loadGL(obj['Textures'], obj['Mappings'])
 
-    # TODO
-    def loadGL(self,textures, mappings):     
-        for channel, path in textures.items():
-            self.textures[channel] = arcade.get_window().ctx.load_texture(path)
+    # mappings sharing a texture go into one batch drawn with a single instanced call
+    def loadGL(self,textures, mappings):
+        for channel, texture in textures.items():
+            path = texture['path']
+            if path not in self.textures:
+                self.textures[path] = self.loadTexture(path)
 
         for label, mapping in mappings.items():
-            channel = mapping['textureChannel']
-            texturePath = textures[channel]['path']
-            textureSize = textures[channel]['size']
-            offset = mapping['offset']
-            size = mapping['size']
-            scale = mapping['subScale']
-            body = self.bodies[mapping['body']]
-            rot = mapping['subRotate']
-            anchor = mapping['subAnchor']
-            self.proxy.append(GLProxy(0, body, pymunk.Vec2d(anchor[0], anchor[1]), rot))
+            path = textures[mapping['textureChannel']]['path']
+            if path not in self.batches:
+                self.batches[path] = GLBatch(self.textures[path])
+            batch = self.batches[path]
+            self.addInstance(batch, mapping, self.bodies[mapping['body']])
+
+    def loadTexture(self, path:str):
+        return self.ctx.load_texture(path)
+
+    def addInstance(self, batch:GLBatch, mapping:Dict, body:pymunk.Body):
+        index = batch.add(mapping['GLmapping'], mapping['GLuv'])
+        self.proxy.append(GLProxy(index, body, batch.transforms))
 
     def update(self):
         for proxy in self.proxy:
-            proxy.body.angle += 0.01
             proxy.update()
 
-    def draw(self):
+    def interpolate(self, alpha:float):
+        previous = self.previousTransforms
         for proxy in self.proxy:
-            pass
-    
+            if proxy.body in previous:
+                proxy.interpolate(previous[proxy.body], alpha)
+            else:
+                proxy.update()
+
+    def draw(self):
+        program = GLLoader.getProgram(self.ctx)
+        for batch in self.batches.values():
+            batch.draw(self.ctx, program)
+
     def debug(self):
         for proxy in self.proxy:
-            print(proxy.body.position.x, proxy.body.position.y, proxy.body.angle)
\ No newline at end of file
+            print(proxy.body.position.x, proxy.body.position.y, proxy.body.angle)
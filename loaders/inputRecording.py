@@ -0,0 +1,221 @@
+import pymunk
+
+from array import array
+import hashlib
+import math
+import random
+import struct
+import zlib
+
+from typing import Callable, Dict, List, Tuple
+
+from .loaderSnapshot import emptySpaceLike, restoreSnapshots
+
+# Input recording layout (little endian):
+#   header      : magic, version, dt, checkpoint interval, steps, checkpoints, state size
+#   zlib blob   : u32 input mask per fixed step, then per checkpoint
+#                 CHECKPOINT record followed by state size f64 values, the
+#                 loader snapshots in order, streamed loaders append their
+#                 focus chunk (NaN when unset)
+
+MAGIC = b'PMKI'
+FORMAT_VERSION = 2
+
+HEADER = struct.Struct('<4sHxxdIIII')
+CHECKPOINT = struct.Struct('<I16s')
+
+
+def loaderStateSize(loader) -> int:
+    bodies, constraints = loader.snapshotLayout()
+    size = sum(size for _, size in bodies.values()) + sum(size for _, size in constraints.values())
+    return size + 2 if loader.streamer else size
+
+
+# all loader snapshots as one state, the order of the loaders matters
+def captureState(loaders:List) -> array:
+    state = array('d')
+    for loader in loaders:
+        state.extend(loader.snapshot())
+        if loader.streamer:
+            focus = loader.streamer.focus
+            state.extend(focus if focus is not None else (math.nan, math.nan))
+    return state
+
+
+# moves the loaders into a fresh space built like their current one and
+# writes the state, the solver keeps nothing of the run before so the steps
+# after it only depend on the state. Returns the new space, whoever steps the
+# old one has to switch
+def restoreState(loaders:List, state) -> pymunk.Space:
+    snapshots = []
+    offset = 0
+    for loader in loaders:
+        size = loaderStateSize(loader)
+        if loader.streamer:
+            x, y = state[offset + size - 2:offset + size]
+            if not math.isnan(x):
+                loader.streamer.setFocus((int(x), int(y)))
+            snapshots.append(state[offset:offset + size - 2])
+        else:
+            snapshots.append(state[offset:offset + size])
+        offset += size
+    space = emptySpaceLike(loaders[0].space)
+    restoreSnapshots(loaders, snapshots, resetSolver=True, space=space)
+    return space
+
+
+def stateHash(state:array) -> bytes:
+    return hashlib.blake2b(state.tobytes(), digest_size=16).digest()
+
+
+class InputRecording:
+    def __init__(self, dt:float, checkpointInterval:int):
+        self.dt = dt
+        self.checkpointInterval = checkpointInterval
+        self.inputs = array('I')
+        # step -> (state hash, state) before the input of that step was applied
+        self.checkpoints:Dict[int, Tuple[bytes, array]] = {}
+
+    def save(self, path:str):
+        stateSize = len(next(iter(self.checkpoints.values()))[1]) if self.checkpoints else 0
+        blob = bytearray(self.inputs.tobytes())
+        for step in sorted(self.checkpoints):
+            digest, state = self.checkpoints[step]
+            blob += CHECKPOINT.pack(step, digest)
+            blob += state.tobytes()
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, self.dt, self.checkpointInterval,
+                                len(self.inputs), len(self.checkpoints), stateSize))
+            f.write(zlib.compress(bytes(blob)))
+
+    @staticmethod
+    def loadFile(path:str) -> 'InputRecording':
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, dt, interval, steps, checkpoints, stateSize = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not an input recording')
+        if version != FORMAT_VERSION:
+            raise ValueError(f'{path} has format version {version}, expected {FORMAT_VERSION}')
+
+        recording = InputRecording(dt, interval)
+        blob = memoryview(zlib.decompress(data[HEADER.size:]))
+        recording.inputs.frombytes(blob[:steps * 4])
+        offset = steps * 4
+        for _ in range(checkpoints):
+            step, digest = CHECKPOINT.unpack_from(blob, offset)
+            offset += CHECKPOINT.size
+            state = array('d')
+            state.frombytes(blob[offset:offset + stateSize * 8])
+            offset += stateSize * 8
+            recording.checkpoints[step] = (digest, state)
+        return recording
+
+
+# records the input mask of every fixed step, call record before the input
+# is applied. Checkpoints restore the state they capture the same way a
+# replay does (see restoreState), so both continue from the same solver
+# state. That moves the loaders to a new space, onSpace gets it
+class InputRecorder:
+    def __init__(self, loaders:List, dt:float, checkpointInterval:int=60):
+        self.loaders = loaders
+        self.recording = InputRecording(dt, checkpointInterval)
+        self.onSpace:Callable[[pymunk.Space], None] = None
+
+    def record(self, inputs:int):
+        recording = self.recording
+        step = len(recording.inputs)
+        if step % recording.checkpointInterval == 0:
+            state = captureState(self.loaders)
+            recording.checkpoints[step] = (stateHash(state), state)
+            space = restoreState(self.loaders, state)
+            if self.onSpace:
+                self.onSpace(space)
+        recording.inputs.append(inputs)
+
+    def save(self, path:str):
+        self.recording.save(path)
+
+
+# plays a recording back on the same scenes, use beforeStep as the
+# FixedStepRunner.beforeStep or call step/seek to drive the space directly.
+# applyInput(inputs, dt) must do what the game did with the recorded mask.
+# Every checkpoint moves the loaders to a new space, self.space follows and
+# onSpace gets it
+class InputReplayer:
+    def __init__(self, recording:InputRecording, space:pymunk.Space, loaders:List,
+                 applyInput:Callable[[int, float], None], substeps:int=1):
+        self.recording = recording
+        self.space = space
+        self.loaders = loaders
+        self.applyInput = applyInput
+        self.substeps = substeps
+        self.onSpace:Callable[[pymunk.Space], None] = None
+        self.frame = 0
+        # checkpoint steps where the replayed state differed from the recorded one
+        self.mismatches:List[int] = []
+        self.seekMismatches:List[Tuple[int, int]] = []
+
+    def restoreCheckpoint(self, state):
+        self.space = restoreState(self.loaders, state)
+        if self.onSpace:
+            self.onSpace(self.space)
+
+    def beforeStep(self, dt:float):
+        recording = self.recording
+        frame = self.frame
+        checkpoint = recording.checkpoints.get(frame)
+        if checkpoint:
+            digest, state = checkpoint
+            if frame != 0 and stateHash(captureState(self.loaders)) != digest:
+                self.mismatches.append(frame)
+            self.restoreCheckpoint(state)
+        self.applyInput(recording.inputs[frame] if frame < len(recording.inputs) else 0, dt)
+        self.frame += 1
+
+    def step(self):
+        dt = self.recording.dt
+        self.beforeStep(dt)
+        for _ in range(self.substeps):
+            self.space.step(dt / self.substeps)
+
+    # restores the nearest checkpoint before frame and simulates the rest
+    def seek(self, frame:int):
+        starts = [step for step in self.recording.checkpoints if step <= frame]
+        if not starts:
+            raise ValueError(f'no checkpoint at or before frame {frame}')
+        self.frame = max(starts)
+        # beforeStep restores the checkpoint again, without comparing it
+        self.restoreCheckpoint(self.recording.checkpoints[self.frame][1])
+        while self.frame < frame:
+            self.step()
+
+    # replays everything from the start, then seeks to random frames and
+    # simulates up to the next checkpoint. Raises when a checkpoint differed
+    # in either pass, mismatches and seekMismatches ((seek frame, checkpoint))
+    # hold the details
+    def verify(self, seeks:int=8, seed:int=0):
+        self.mismatches = []
+        self.seek(0)
+        while self.frame < len(self.recording.inputs):
+            self.step()
+        replayed = list(self.mismatches)
+
+        self.seekMismatches = []
+        checkpoints = sorted(self.recording.checkpoints)
+        rng = random.Random(seed)
+        for _ in range(seeks):
+            frame = rng.randrange(len(self.recording.inputs))
+            later = [step for step in checkpoints if step > frame]
+            if not later:
+                continue
+            count = len(self.mismatches)
+            self.seek(frame)
+            while self.frame <= later[0]:
+                self.step()
+            if len(self.mismatches) > count:
+                self.seekMismatches.append((frame, later[0]))
+
+        if replayed or self.seekMismatches:
+            raise RuntimeError(f'replay differs from the recording at checkpoints {replayed}, '
+                               f'{len(self.seekMismatches)} of {seeks} seeks diverged {self.seekMismatches}')
@@ -0,0 +1,81 @@
+from typing import List, Tuple
+import math
+
+Point = Tuple[float, float]
+
+
+def pointLineDistance(p:Point, a:Point, b:Point) -> float:
+    dx = b[0] - a[0]
+    dy = b[1] - a[1]
+    length = math.sqrt(dx * dx + dy * dy)
+    if length == 0.0:
+        return math.sqrt((p[0] - a[0]) ** 2 + (p[1] - a[1]) ** 2)
+    return abs(dx * (a[1] - p[1]) - dy * (a[0] - p[0])) / length
+
+
+# exported Line points are [x1, y1, x2, y2] segments, consecutive segments
+# sharing an end point are joined into one chain of vertices
+def buildChains(segments:List[List[float]], minLength:float) -> List[List[Point]]:
+    chains:List[List[Point]] = []
+    for x1, y1, x2, y2 in segments:
+        if chains and math.isclose(chains[-1][-1][0], x1, abs_tol=minLength) and math.isclose(chains[-1][-1][1], y1, abs_tol=minLength):
+            chain = chains[-1]
+        else:
+            chain = [(x1, y1)]
+            chains.append(chain)
+        # degenerate segments add no vertex
+        last = chain[-1]
+        if math.sqrt((x2 - last[0]) ** 2 + (y2 - last[1]) ** 2) > minLength:
+            chain.append((x2, y2))
+    return [chain for chain in chains if len(chain) > 1]
+
+
+# Douglas-Peucker, keeps the farthest vertex of a span while it is out of tolerance
+def douglasPeucker(points:List[Point], tolerance:float) -> List[Point]:
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    spans = [(0, len(points) - 1)]
+    while spans:
+        first, last = spans.pop()
+        farthest = -1
+        distance = tolerance
+        for k in range(first + 1, last):
+            d = pointLineDistance(points[k], points[first], points[last])
+            if d > distance:
+                farthest = k
+                distance = d
+        if farthest >= 0:
+            keep[farthest] = True
+            spans.append((first, farthest))
+            spans.append((farthest, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def simplifyChain(chain:List[Point], tolerance:float) -> List[Point]:
+    return douglasPeucker(chain, tolerance)
+
+
+# closed outline, split at the vertex farthest from the first one so both
+# halves are simplified as open chains, at least a triangle is kept
+def simplifyPolygon(points:List[Point], tolerance:float) -> List[Point]:
+    if len(points) <= 3:
+        return list(points)
+    start = points[0]
+    far = max(range(1, len(points)), key=lambda i: (points[i][0] - start[0]) ** 2 + (points[i][1] - start[1]) ** 2)
+    first = douglasPeucker(points[:far + 1], tolerance)
+    second = douglasPeucker(points[far:] + [start], tolerance)
+    result = first[:-1] + second[:-1]
+    if len(result) < 3:
+        return list(points)
+    return result
+
+
+# Douglas-Peucker on every chain of joined segments, the baked segments
+# run between consecutive kept vertices
+def bakeLine(segments:List[List[float]], tolerance:float, minLength:float=1e-9) -> List[List[Point]]:
+    return [simplifyChain(chain, tolerance) for chain in buildChains(segments, minLength)]
+
+
+def isClosed(chain:List[Point], minLength:float=1e-9) -> bool:
+    return len(chain) > 3 and math.isclose(chain[0][0], chain[-1][0], abs_tol=minLength) and \
+           math.isclose(chain[0][1], chain[-1][1], abs_tol=minLength)
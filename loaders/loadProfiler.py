@@ -0,0 +1,99 @@
+from typing import Callable, Dict, List, Tuple
+import json
+import os
+import threading
+import time
+
+
+class PhaseStats:
+    __slots__ = ('total', 'own', 'calls')
+
+    def __init__(self):
+        # total includes nested phases, own excludes them
+        self.total = 0.0
+        self.own = 0.0
+        self.calls = 0
+
+
+class LoadReport:
+    def __init__(self, phases:Dict[str, PhaseStats], wall:float):
+        self.phases = phases
+        self.wall = wall
+
+    def asDict(self) -> Dict:
+        return {'wall': self.wall,
+                'phases': {name: {'total': stats.total, 'own': stats.own, 'calls': stats.calls}
+                           for name, stats in self.phases.items()}}
+
+    def format(self) -> str:
+        lines = [f'{"phase":<26}{"calls":>8}{"total ms":>12}{"own ms":>12}']
+        for name, stats in sorted(self.phases.items(), key=lambda item: -item[1].own):
+            lines.append(f'{name:<26}{stats.calls:>8}{stats.total * 1000.0:>12.3f}{stats.own * 1000.0:>12.3f}')
+        lines.append(f'{"wall":<26}{"":>8}{self.wall * 1000.0:>12.3f}')
+        return '\n'.join(lines)
+
+
+# times loader methods it wraps, loaders without a profiler run unwrapped methods
+class LoadProfiler:
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        # (phase, thread id, start, duration) in seconds since origin
+        self.events:List[Tuple[str, int, float, float]] = []
+        self.phases:Dict[str, PhaseStats] = {}
+        self.local = threading.local()
+
+    def wrap(self, phase:str, function:Callable) -> Callable:
+        def profiled(*args, **kwargs):
+            stack = getattr(self.local, 'stack', None)
+            if stack is None:
+                stack = self.local.stack = []
+            # nested phases add their time to the parent entry
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                duration = time.perf_counter() - start
+                nested = stack.pop()
+                if stack:
+                    stack[-1] += duration
+                self.add(phase, start - self.origin, duration, duration - nested)
+        profiled.__wrapped__ = function
+        return profiled
+
+    def add(self, phase:str, start:float, duration:float, own:float):
+        with self.lock:
+            stats = self.phases.get(phase)
+            if stats is None:
+                stats = self.phases[phase] = PhaseStats()
+            stats.total += duration
+            stats.own += own
+            stats.calls += 1
+            self.events.append((phase, threading.get_ident(), start, duration))
+
+    # replaces bound methods of the loader by timed ones, method name -> phase
+    def instrument(self, loader, phases:Dict[str, str]):
+        for method, phase in phases.items():
+            setattr(loader, method, self.wrap(phase, getattr(loader, method)))
+
+    @staticmethod
+    def uninstrument(loader, phases:Dict[str, str]):
+        for method in phases:
+            loader.__dict__.pop(method, None)
+
+    def report(self) -> LoadReport:
+        with self.lock:
+            wall = max((start + duration for _, _, start, duration in self.events), default=0.0) - \
+                   min((start for _, _, start, _ in self.events), default=0.0)
+            return LoadReport(dict(self.phases), wall)
+
+    # chrome://tracing and Perfetto read complete events with microsecond times
+    def writeTrace(self, path:str):
+        pid = os.getpid()
+        with self.lock:
+            events = [{'name': phase, 'cat': 'load', 'ph': 'X', 'pid': pid, 'tid': tid,
+                       'ts': start * 1e6, 'dur': duration * 1e6}
+                      for phase, tid, start, duration in self.events]
+        with open(path, 'w') as f:
+            f.write(json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'}))
@@ -0,0 +1,229 @@
+import pymunk
+from pymunk import constraints
+
+from array import array
+from typing import Dict, List, Tuple
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# x, y, angle, velocity x, velocity y, angular velocity, force x, force y, torque, sleeping
+BODY_STATE_SIZE = 10
+# runtime adjustable parameters of every constraint class, vectors take two floats
+CONSTRAINT_STATE = {
+    constraints.DampedRotarySpring: ('rest_angle', 'stiffness', 'damping'),
+    constraints.DampedSpring: ('anchor_a', 'anchor_b', 'rest_length', 'stiffness', 'damping'),
+    constraints.GearJoint: ('phase', 'ratio'),
+    constraints.GrooveJoint: ('groove_a', 'groove_b', 'anchor_b'),
+    constraints.PinJoint: ('anchor_a', 'anchor_b', 'distance'),
+    constraints.PivotJoint: ('anchor_a', 'anchor_b'),
+    constraints.RatchetJoint: ('angle', 'phase', 'ratchet'),
+    constraints.RotaryLimitJoint: ('min', 'max'),
+    constraints.SimpleMotor: ('rate',),
+    constraints.SlideJoint: ('anchor_a', 'anchor_b', 'min', 'max'),
+}
+CONSTRAINT_COMMON_STATE = ('max_force', 'error_bias', 'max_bias')
+VECTOR_STATE = {'anchor_a', 'anchor_b', 'groove_a', 'groove_b'}
+# copied to the fresh space of a solver reset
+SPACE_SETTINGS = ('gravity', 'damping', 'iterations', 'idle_speed_threshold', 'sleep_time_threshold',
+                  'collision_slop', 'collision_bias', 'collision_persistence')
+# constructor arguments after the two bodies, used to rebuild constraints
+CONSTRAINT_ARGUMENTS = {
+    constraints.DampedRotarySpring: ('rest_angle', 'stiffness', 'damping'),
+    constraints.DampedSpring: ('anchor_a', 'anchor_b', 'rest_length', 'stiffness', 'damping'),
+    constraints.GearJoint: ('phase', 'ratio'),
+    constraints.GrooveJoint: ('groove_a', 'groove_b', 'anchor_b'),
+    constraints.PinJoint: ('anchor_a', 'anchor_b'),
+    constraints.PivotJoint: ('anchor_a', 'anchor_b'),
+    constraints.RatchetJoint: ('phase', 'ratchet'),
+    constraints.RotaryLimitJoint: ('min', 'max'),
+    constraints.SimpleMotor: ('rate',),
+    constraints.SlideJoint: ('anchor_a', 'anchor_b', 'min', 'max'),
+}
+
+
+def constraintStateKeys(constraint:pymunk.Constraint) -> Tuple[str, ...]:
+    return CONSTRAINT_STATE.get(type(constraint), ()) + CONSTRAINT_COMMON_STATE
+
+
+def constraintStateSize(constraint:pymunk.Constraint) -> int:
+    return sum(2 if key in VECTOR_STATE else 1 for key in constraintStateKeys(constraint))
+
+
+# offset and size of every body and constraint in the flat snapshot, keyed by the loader labels
+def snapshotLayout(loader) -> Tuple[Dict[str, Tuple[int, int]], Dict[str, Tuple[int, int]]]:
+    offset = 0
+    bodies:Dict[str, Tuple[int, int]] = {}
+    for label in loader.bodies:
+        bodies[label] = (offset, BODY_STATE_SIZE)
+        offset += BODY_STATE_SIZE
+    constraintsLayout:Dict[str, Tuple[int, int]] = {}
+    for label, constraint in loader.constraints.items():
+        size = constraintStateSize(constraint)
+        constraintsLayout[label] = (offset, size)
+        offset += size
+    return bodies, constraintsLayout
+
+
+def checkSnapshotSize(loader, data):
+    _, constraintsLayout = snapshotLayout(loader)
+    size = len(loader.bodies) * BODY_STATE_SIZE + sum(size for _, size in constraintsLayout.values())
+    if len(data) != size:
+        raise ValueError(f'snapshot has {len(data)} values, loader needs {size}')
+
+
+def takeSnapshot(loader):
+    values:List[float] = []
+    for body in loader.bodies.values():
+        values.extend((*body.position, body.angle, *body.velocity, body.angular_velocity,
+                       *body.force, body.torque, 1.0 if body.is_sleeping else 0.0))
+    for constraint in loader.constraints.values():
+        for key in constraintStateKeys(constraint):
+            if key in VECTOR_STATE:
+                values.extend(getattr(constraint, key))
+            else:
+                values.append(getattr(constraint, key))
+    if np is not None:
+        return np.array(values, dtype=np.float64)
+    return array('d', values)
+
+
+# writes the snapshot into the existing bodies and constraints, nothing is
+# re-added or replaced so references callers hold stay valid. Chipmunk keeps
+# contact and joint impulses between steps and pymunk cannot read or reset
+# them, they carry over from the state before the restore, see restoreSnapshots
+# for a restore that resets them
+def restoreSnapshot(loader, data, force:bool=False):
+    checkSnapshotSize(loader, data)
+    data = data.tolist() if hasattr(data, 'tolist') else list(data)
+    space:pymunk.Space = loader.space
+
+    sleeping:List[pymunk.Body] = []
+    offset = 0
+    for body in loader.bodies.values():
+        x, y, angle, vx, vy, angularVelocity, fx, fy, torque, sleep = data[offset:offset + BODY_STATE_SIZE]
+        offset += BODY_STATE_SIZE
+        # setters recompute chipmunk's center of gravity position and wake the
+        # body, equal values are skipped so restoring the current state is a no-op
+        # unless forced. The cog stays in place when the angle changes, so the
+        # angle goes first
+        if force or body.angle != angle:
+            body.angle = angle
+        if force or body.position != (x, y):
+            body.position = (x, y)
+        if force or body.velocity != (vx, vy):
+            body.velocity = (vx, vy)
+        if force or body.angular_velocity != angularVelocity:
+            body.angular_velocity = angularVelocity
+        if force or body.force != (fx, fy):
+            body.force = (fx, fy)
+        if force or body.torque != torque:
+            body.torque = torque
+        # the split impulse velocity of the last solve is only cleared by
+        # integrating the position, a zero step clears it without moving
+        if force and body.body_type != pymunk.Body.STATIC:
+            pymunk.Body.update_position(body, 0.0)
+        if sleep:
+            sleeping.append(body)
+
+    for constraint in loader.constraints.values():
+        for key in constraintStateKeys(constraint):
+            if key in VECTOR_STATE:
+                value = (data[offset], data[offset + 1])
+                offset += 2
+            else:
+                value = data[offset]
+                offset += 1
+            if force or getattr(constraint, key) != value:
+                setattr(constraint, key, value)
+
+    if space is not None and space.sleep_time_threshold < math.inf:
+        for body in sleeping:
+            if body.body_type == pymunk.Body.DYNAMIC and body.space is space:
+                body.sleep()
+
+
+# an empty space with the settings of space, collision handlers and a spatial
+# hash broadphase are not carried over
+def emptySpaceLike(space:pymunk.Space) -> pymunk.Space:
+    empty = pymunk.Space()
+    for key in SPACE_SETTINGS:
+        setattr(empty, key, getattr(space, key))
+    return empty
+
+
+# a new constraint with the same bodies, parameters and callbacks, chipmunk
+# keeps the accumulated joint impulse inside the old one
+def rebuildConstraint(constraint:pymunk.Constraint) -> pymunk.Constraint:
+    rebuilt = type(constraint)(constraint.a, constraint.b,
+                               *(getattr(constraint, key) for key in CONSTRAINT_ARGUMENTS[type(constraint)]))
+    for key in CONSTRAINT_COMMON_STATE:
+        setattr(rebuilt, key, getattr(constraint, key))
+    rebuilt.collide_bodies = constraint.collide_bodies
+    if constraint.pre_solve:
+        rebuilt.pre_solve = constraint.pre_solve
+    if constraint.post_solve:
+        rebuilt.post_solve = constraint.post_solve
+    return rebuilt
+
+
+# removes every object of the loaders from their space and adds it back in load
+# order with rebuilt constraints, so no contact or joint impulses survive. The
+# states are written before the shapes go back, the broadphase is then built
+# from them and not from where the previous run ended. Shapes and bodies stay
+# the same objects, constraints are replaced in loader.constraints. Streamed
+# static shapes come back for the current focus. With a target space the
+# objects move there: chipmunk numbers shapes per space on every add and the
+# broadphase visits them in that order, only a fresh space repeats it exactly
+def resetObjects(loaders:List, states:List, target:pymunk.Space=None):
+    space:pymunk.Space = loaders[0].space
+    added = set(space.constraints)
+    objects:List = []
+    present:List[Tuple[Dict[str, pymunk.Body], Dict[str, pymunk.Constraint]]] = []
+    for loader in loaders:
+        bodies = {label: body for label, body in loader.bodies.items() if body.space is space}
+        constraintsByLabel = {label: constraint for label, constraint in loader.constraints.items() if constraint in added}
+        for body in bodies.values():
+            objects.extend(shape for shape in loader.bodyShapes(body) if shape.space is space)
+        objects.extend(constraintsByLabel.values())
+        objects.extend(bodies.values())
+        present.append((bodies, constraintsByLabel))
+    space.remove(*objects)
+    if target is not None:
+        for loader in loaders:
+            loader.setSpace(target)
+
+    for loader, data, (bodies, constraintsByLabel) in zip(loaders, states, present):
+        for label, constraint in constraintsByLabel.items():
+            constraintsByLabel[label] = loader.constraints[label] = rebuildConstraint(constraint)
+        restoreSnapshot(loader, data, True)
+        focus = None
+        if loader.streamer:
+            focus = loader.streamer.focus
+            loader.streamer.clear()
+        loader.addObjects(bodies, constraintsByLabel.values())
+        if focus is not None:
+            loader.streamer.setFocus(focus)
+
+
+# restores loaders sharing one space, states in the same order. resetSolver
+# re-adds everything (see resetObjects) so no solver state of the run before
+# survives, the space must hold nothing but these loaders then: other
+# broadphase entries keep the history of the run. Steps are repeated bit for
+# bit only when the objects also go to a fresh space, pass it as space.
+# References to the old constraints are stale after a reset, look them up by label
+def restoreSnapshots(loaders:List, states:List, resetSolver:bool=False, space:pymunk.Space=None):
+    if len(loaders) != len(states):
+        raise ValueError(f'{len(states)} snapshots for {len(loaders)} loaders')
+    if space is not None and not resetSolver:
+        raise ValueError('moving to another space needs resetSolver')
+    for loader, data in zip(loaders, states):
+        checkSnapshotSize(loader, data)
+    if resetSolver and loaders:
+        resetObjects(loaders, states, space)
+    for loader, data in zip(loaders, states):
+        # re-added bodies got their custom center of gravity back, every value is written
+        restoreSnapshot(loader, data, resetSolver)
@@ -1,12 +1,36 @@
 import pymunk
 
 
-from typing import Dict, List
+from typing import Dict, Iterable, List, Tuple
 import json
 import math
 
+from geometry.convexDecomposition import decompose, signedArea
+from .binaryScene import BinaryScene, BODY_TYPES, CONSTRAINT_TYPES, \
+                         BODY_CUSTOM_MASS, BODY_CUSTOM_MOMENT, BODY_CUSTOM_COG, \
+                         SHAPE_POLYGON, SHAPE_CIRCLE, SHAPE_LINE, SHAPE_CUSTOM_MASS, SHAPE_SENSOR, \
+                         CONSTRAINT_SELF_COLLIDE
+from .scenePrototype import ScenePrototype
+from .chunkStreamer import ChunkStreamer
+from .lineBaking import bakeLine, isClosed, simplifyPolygon
+from .spaceTuning import tuneSpace
+from .loaderSnapshot import snapshotLayout, takeSnapshot, restoreSnapshots, rebuildConstraint
+from .loadProfiler import LoadProfiler
+
 class PymunkLoader:
 
+    # methods timed by enableProfiling, method name -> phase. The own time of
+    # loadBinaryFile is the read and decode, object construction is loadBinary
+    PROFILED_PHASES = {'readFile': 'file read',
+                       'decodeData': 'json decode',
+                       'loadBinaryFile': 'binary read and decode',
+                       'loadBinary': 'binary object construction',
+                       'buildPrototype': 'prototype construction',
+                       'loadBody': 'body construction',
+                       'loadShape': 'shape construction',
+                       'loadConstraint': 'constraint construction',
+                       'addObjects': 'space insertion'}
+
     def __init__(self, space:pymunk.Space):
         self.space = space
         self.constraints:Dict[str, pymunk.Constraint] = {}
@@ -15,6 +39,79 @@ class PymunkLoader:
         # 4 dicts below are not needed i guess
         self.shapes:Dict[str, pymunk.Shape] = {}
         self.lines:Dict[str, List[pymunk.Shape]] = {}
+        # body.shapes is a set, shapes of every body in the order they were created
+        self.bodyShapeLists:Dict[pymunk.Body, List[pymunk.Shape]] = {}
+        self.streamer:ChunkStreamer = None
+        self.bakeTolerance:float = None
+        self.bakeStats:Dict[str, int] = {'segments': 0, 'baked': 0}
+        self.simplifyTolerance:float = None
+        self.simplifyStats:Dict[str, int] = {'vertices': 0, 'simplified': 0}
+        self.simplifiedBodies:set = set()
+        self.decomposeConcave:bool = False
+        # convex pieces of every Polygon, the first one is also in shapes
+        self.pieces:Dict[str, List[pymunk.Shape]] = {}
+        self.profiler:LoadProfiler = None
+        # set when the loader is an instance of a prototype, unload pools it there
+        self.prototype:ScenePrototype = None
+        # body transforms (x, y, angle) before the last fixed step
+        self.previousTransforms:Dict[pymunk.Body, Tuple[float, float, float]] = {}
+
+    # shapes of static bodies are added to the space only near the focus point
+    def enableStreaming(self, chunkSize:float=20.0, radius:int=1):
+        self.streamer = ChunkStreamer(self.space, chunkSize, radius)
+
+    # joins the segments of Line shapes into chains and drops the vertices
+    # within tolerance of them (Douglas-Peucker, see lineBaking.bakeLine)
+    def enableBaking(self, tolerance:float=0.01):
+        self.bakeTolerance = tolerance
+
+    # drops Polygon vertices and Line segments within tolerance of the outline,
+    # vertex reduction is counted in simplifyStats and bakeStats
+    def enableSimplification(self, tolerance:float=0.01):
+        self.simplifyTolerance = tolerance
+        self.bakeTolerance = tolerance
+
+    # concave polygons become several convex shapes instead of their hull,
+    # see convexDecomposition.decompose
+    def enableDecomposition(self):
+        self.decomposeConcave = True
+
+    # simplification, decomposition and baking are applied by loadShape only,
+    # the binary and prototype loads hand their shapes to it when one is enabled
+    def hasShapeProcessing(self) -> bool:
+        return self.simplifyTolerance is not None or self.bakeTolerance is not None or self.decomposeConcave
+
+    # exported mass, moment and cog are the final values of the original
+    # geometry, they are kept when simplification changed the shapes
+    def keptPhysics(self, body:pymunk.Body, physics:Dict) -> Dict:
+        if body in self.simplifiedBodies and body.body_type == pymunk.Body.DYNAMIC:
+            return dict(physics, hasCustomMass=True, hasCustomMoment=True, hasCustomCog=True)
+        return physics
+
+    # wraps the PROFILED_PHASES methods of this loader, without a profiler
+    # the plain methods run so there is no cost when it is not enabled
+    def enableProfiling(self, profiler:LoadProfiler=None) -> LoadProfiler:
+        if self.profiler:
+            self.disableProfiling()
+        self.profiler = profiler or LoadProfiler()
+        self.profiler.instrument(self, self.PROFILED_PHASES)
+        return self.profiler
+
+    def disableProfiling(self):
+        LoadProfiler.uninstrument(self, self.PROFILED_PHASES)
+        self.profiler = None
+
+    def updateFocus(self, x:float, y:float):
+        if self.streamer:
+            self.streamer.updateFocus(x, y)
+
+    def setSpace(self, space:pymunk.Space):
+        self.space = space
+        if self.streamer:
+            self.streamer.space = space
+
+    def storeTransforms(self):
+        self.previousTransforms = {body: (*body.position, body.angle) for body in self.bodies.values()}
 
     def move(self, x:float, y:float):
         for body in self.bodies.values():
@@ -22,14 +119,127 @@ class PymunkLoader:
             body.position = (pos.x + x, pos.y + y)
 
     def loadFile(self, path:str):
-        data = None
-        obj = None
-        with open(path, 'r') as f:
-            data = f.read()
+        data = self.readFile(path)
         if data:
-            obj = json.loads(data)
+            obj = self.decodeData(data)
             self.loadData(obj)
 
+    def readFile(self, path:str) -> str:
+        with open(path, 'r') as f:
+            return f.read()
+
+    def decodeData(self, data:str) -> Dict:
+        return json.loads(data)
+
+    # returns the created bodies by label and constraints, see addObjects
+    def loadPrototype(self, prototype:ScenePrototype, offsetX:float=0.0, offsetY:float=0.0, angle:float=0.0) -> Tuple[Dict[str, pymunk.Body], List[pymunk.Constraint]]:
+        return self.buildPrototype(prototype, offsetX, offsetY, angle)
+
+    # physics objects of the prototype only, subclasses add what they draw in loadPrototype
+    def buildPrototype(self, prototype:ScenePrototype, offsetX:float=0.0, offsetY:float=0.0, angle:float=0.0) -> Tuple[Dict[str, pymunk.Body], List[pymunk.Constraint]]:
+        return prototype.build(self, offsetX, offsetY, angle)
+
+    def loadBinaryFile(self, path:str, offsetX:float=0.0, offsetY:float=0.0) -> BinaryScene:
+        scene = BinaryScene.loadFile(path)
+        self.loadBinary(scene, offsetX, offsetY)
+        return scene
+
+    def loadBinary(self, scene:BinaryScene, offsetX:float=0.0, offsetY:float=0.0):
+        strings = scene.strings
+        floats = scene.floats
+        shapes = scene.shapes
+        bodyTypes = {'Dynamic': pymunk.Body.DYNAMIC,
+                     'Kinematic': pymunk.Body.KINEMATIC,
+                     'Static': pymunk.Body.STATIC}
+        bodies:List[pymunk.Body] = []
+        processShapes = self.hasShapeProcessing()
+
+        for label, typ, flags, mass, moment, cogX, cogY, firstShape, shapeCount in scene.bodies:
+            body = pymunk.Body(body_type = bodyTypes[BODY_TYPES[typ]])
+            body.position = (offsetX, offsetY)
+            bodies.append(body)
+            self.bodies[strings[label]] = body
+            physics = {'hasCustomMass': bool(flags & BODY_CUSTOM_MASS),
+                       'hasCustomMoment': bool(flags & BODY_CUSTOM_MOMENT),
+                       'hasCustomCog': bool(flags & BODY_CUSTOM_COG),
+                       'customMass': mass,
+                       'customMoment': moment,
+                       'cog': [cogX, cogY]}
+
+            if processShapes:
+                for record in shapes[firstShape: firstShape + shapeCount]:
+                    self.loadShape(scene.getShapeDict(record), strings[record[0]], body)
+                self.bodiesPhysics[strings[label]] = self.keptPhysics(body, physics)
+                continue
+            self.bodiesPhysics[strings[label]] = physics
+
+            for (sLabel, kind, sFlags, filterGroup, filterCategory, filterMask, first, count,
+                 radius, offX, offY, elasticity, friction, sMass, density) in shapes[firstShape: firstShape + shapeCount]:
+                shapeFilter = pymunk.ShapeFilter(filterGroup, filterCategory, filterMask)
+                if kind == SHAPE_LINE:
+                    lines = []
+                    for i in range(first, first + count, 4):
+                        x1, y1, x2, y2 = floats[i: i + 4]
+                        s = pymunk.Segment(body, (x1, y1), (x2, y2), radius)
+                        s.elasticity = elasticity
+                        s.friction = friction
+                        s.sensor = bool(sFlags & SHAPE_SENSOR)
+                        s.filter = shapeFilter
+                        if sFlags & SHAPE_CUSTOM_MASS:
+                            s.mass = math.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2) / sMass
+                        else:
+                            s.density = density
+                        lines.append(s)
+                        self.keepShape(body, s)
+                    self.lines[strings[sLabel]] = lines
+                    continue
+                if kind == SHAPE_POLYGON:
+                    points = [(floats[i], floats[i + 1]) for i in range(first, first + count, 2)]
+                    s = pymunk.Poly(body, points, radius=radius)
+                elif kind == SHAPE_CIRCLE:
+                    s = pymunk.Circle(body, radius, (offX, offY))
+                else:
+                    continue
+                s.elasticity = elasticity
+                s.friction = friction
+                s.sensor = bool(sFlags & SHAPE_SENSOR)
+                s.filter = shapeFilter
+                if sFlags & SHAPE_CUSTOM_MASS:
+                    s.mass = sMass
+                else:
+                    s.density = density
+                self.shapes[strings[sLabel]] = s
+                self.keepShape(body, s)
+
+        for label, kind, flags, bodyA, bodyB, maxBias, errorBias, maxForce, *params in scene.constraints:
+            constraintObj = self.createConstraint(CONSTRAINT_TYPES[kind][0], bodies[bodyA], bodies[bodyB], params)
+            constraintObj.max_bias = maxBias
+            constraintObj.error_bias = errorBias
+            constraintObj.max_force = maxForce
+            constraintObj.collide_bodies = bool(flags & CONSTRAINT_SELF_COLLIDE)
+            self.constraints[strings[label]] = constraintObj
+
+    def createConstraint(self, type:str, bodyA:pymunk.Body, bodyB:pymunk.Body, p:List[float]) -> pymunk.Constraint:
+        if type == "Rotary Spring":
+            return pymunk.constraints.DampedRotarySpring(bodyA, bodyB, p[0], p[1], p[2])
+        elif type == "Damped Spring":
+            return pymunk.constraints.DampedSpring(bodyA, bodyB, (p[0], p[1]), (p[2], p[3]), p[4], p[5], p[6])
+        elif type == "Gear":
+            return pymunk.constraints.GearJoint(bodyA, bodyB, p[0], p[1])
+        elif type == "Groove":
+            return pymunk.constraints.GrooveJoint(bodyA, bodyB, (p[0], p[1]), (p[2], p[3]), (p[4], p[5]))
+        elif type == "Pin":
+            return pymunk.constraints.PinJoint(bodyA, bodyB, (p[0], p[1]), (p[2], p[3]))
+        elif type == "Pivot":
+            return pymunk.constraints.PivotJoint(bodyA, bodyB, (p[0], p[1]), (p[2], p[3]))
+        elif type == "Ratchet":
+            return pymunk.constraints.RatchetJoint(bodyA, bodyB, p[0], p[1])
+        elif type == "Rotary Limit":
+            return pymunk.constraints.RotaryLimitJoint(bodyA, bodyB, p[0], p[1])
+        elif type == "Motor":
+            return pymunk.constraints.SimpleMotor(bodyA, bodyB, p[0])
+        return pymunk.constraints.SlideJoint(bodyA, bodyB, (p[0], p[1]), (p[2], p[3]), p[4], p[5])
+
     def loadData(self, obj:Dict, offsetX:float=0.0, offsetY:float=0.0):
         self.loadBodies(obj['Bodies'], offsetX, offsetY)
         self.loadConstraints(obj['Constraints'])
@@ -58,7 +268,7 @@ class PymunkLoader:
         for sLabel, shape in shapes.items():
             self.loadShape(shape, sLabel, self.bodies[label])
 
-        self.bodiesPhysics[label] = physics
+        self.bodiesPhysics[label] = self.keptPhysics(body, physics)
 
     def loadShape(self, shape:Dict, label:str, body:pymunk.Body):
         type:str = shape['type']
@@ -75,16 +285,36 @@ class PymunkLoader:
             points = []
             for point in shape['internal']['points']:
                 points.append((point[0], point[1]))
-            s = pymunk.Poly(body=body, vertices=points, radius=shape['internal']['radius'])
-            s.elasticity = elasticity
-            s.friction = friction
-            s.sensor = isSensor
-            s.filter = pymunk.ShapeFilter(filterGroup, filterCategory, filterMask)
-            self.shapes[label] = s
-            if physics['hasCustomMass']:
-                s.mass = physics['customMass']
-            else:
-                s.density = physics['customDensity']
+            simplified = False
+            if self.simplifyTolerance is not None and type == 'Polygon':
+                self.simplifyStats['vertices'] += len(points)
+                reduced = simplifyPolygon(points, self.simplifyTolerance)
+                self.simplifyStats['simplified'] += len(reduced)
+                if len(reduced) < len(points):
+                    points = reduced
+                    simplified = True
+                    self.simplifiedBodies.add(body)
+            pieces = [points]
+            if self.decomposeConcave and type == 'Polygon':
+                # exported pieces describe the original outline only
+                exported = shape['internal'].get('convex')
+                pieces = exported if exported and not simplified else decompose(points)
+            # a custom mass is split between the pieces by area
+            area = sum(abs(signedArea(piece)) for piece in pieces)
+            self.pieces[label] = []
+            for piece in pieces:
+                s = pymunk.Poly(body=body, vertices=[(point[0], point[1]) for point in piece], radius=shape['internal']['radius'])
+                s.elasticity = elasticity
+                s.friction = friction
+                s.sensor = isSensor
+                s.filter = pymunk.ShapeFilter(filterGroup, filterCategory, filterMask)
+                if physics['hasCustomMass']:
+                    s.mass = physics['customMass'] * (abs(signedArea(piece)) / area if len(pieces) > 1 else 1.0)
+                else:
+                    s.density = physics['customDensity']
+                self.pieces[label].append(s)
+                self.keepShape(body, s)
+            self.shapes[label] = self.pieces[label][0]
         elif type == 'Circle':
             placement = shape['internal']['offset']
             s = pymunk.Circle(body=body, radius=shape['internal']['radius'], offset=placement)
@@ -93,13 +323,23 @@ class PymunkLoader:
             s.sensor = isSensor
             s.filter = pymunk.ShapeFilter(filterGroup, filterCategory, filterMask)
             self.shapes[label] = s
+            self.keepShape(body, s)
             if physics['hasCustomMass']:
                 s.mass = physics['customMass']
             else:
                 s.density = physics['customDensity']
         elif type == 'Line':
             self.lines[label] = []
-            for point in shape['internal']['points']:
+            points = shape['internal']['points']
+            if self.bakeTolerance is not None:
+                self.bakeStats['segments'] += len(points)
+                chains = bakeLine(points, self.bakeTolerance)
+                baked = [[a[0], a[1], b[0], b[1]] for chain in chains for a, b in zip(chain, chain[1:])]
+                self.bakeStats['baked'] += len(baked)
+                if len(baked) < len(points):
+                    self.simplifiedBodies.add(body)
+                points = baked
+            for point in points:
                 p1 = (point[0], point[1])
                 p2 = (point[2], point[3])
                 s = pymunk.Segment(body=body, a=p1, b=p2, radius=shape['internal']['radius'])
@@ -113,6 +353,23 @@ class PymunkLoader:
                 else:
                     s.density = physics['customDensity']
                 self.lines[label].append(s)
+                self.keepShape(body, s)
+            if self.bakeTolerance is not None:
+                self.setNeighbours(self.lines[label], chains)
+
+    # lets chipmunk ignore collisions with the cracks between joined segments
+    def setNeighbours(self, segments:List[pymunk.Segment], chains:List[List[Tuple[float, float]]]):
+        first = 0
+        for chain in chains:
+            count = len(chain) - 1
+            closed = isClosed(chain)
+            for i in range(count):
+                a = chain[i]
+                b = chain[i + 1]
+                prev = chain[i - 1] if i > 0 else (chain[-2] if closed else a)
+                next = chain[i + 2] if i + 2 < len(chain) else (chain[1] if closed else b)
+                segments[first + i].set_neighbors(prev, next)
+            first += count
 
     def loadBodyPhysics(self, body: pymunk.Body, physics:dict):
         if physics['hasCustomMass']:
@@ -206,11 +463,92 @@ class PymunkLoader:
         self.constraints[label] = constraintObj
 
     def addAll(self):
-        for l, b in self.bodies.items():
-            self.space.add(b)
-            for shape in b.shapes:
-                self.space.add(shape)
+        self.addObjects(self.bodies, self.constraints.values())
+
+    # adds only the given bodies (by label), their shapes and the constraints,
+    # so later loads do not re-add earlier ones
+    def addObjects(self, bodies:Dict[str, pymunk.Body], constraints:Iterable[pymunk.Constraint]):
+        objects:List = list(bodies.values())
+        streamed:List[pymunk.Shape] = []
+        for b in bodies.values():
+            if self.streamer and b.body_type == pymunk.Body.STATIC:
+                streamed.extend(self.bodyShapes(b))
+            else:
+                objects.extend(self.bodyShapes(b))
+        objects.extend(constraints)
+        self.space.add(*objects)
+        # shapes accumulate their mass into the body when added to a space,
+        # so custom body physics can only be applied after the insertion
+        for l, b in bodies.items():
             self.loadBodyPhysics(b, self.bodiesPhysics[l])
-        for c in self.constraints.values():
-            self.space.add(c)
-        
\ No newline at end of file
+        for shape in streamed:
+            self.streamer.addShape(shape)
+
+    def keepShape(self, body:pymunk.Body, shape:pymunk.Shape):
+        self.bodyShapeLists.setdefault(body, []).append(shape)
+
+    # the insertion order into the space changes the solver order so shapes
+    # are added in the order they were created
+    def bodyShapes(self, body:pymunk.Body) -> List[pymunk.Shape]:
+        return self.bodyShapeLists.get(body, [])
+
+    def removeAll(self):
+        objects:List = list(self.constraints.values())
+        for b in self.bodies.values():
+            objects.extend(shape for shape in b.shapes if shape.space is not None)
+        objects.extend(b for b in self.bodies.values() if b.space is not None)
+        self.space.remove(*objects)
+        if self.streamer:
+            self.streamer.clear()
+
+    # removes everything from the space, an instance of a prototype goes back
+    # to its pool with its bodies, shapes and constraints
+    def unload(self):
+        self.removeAll()
+        if self.prototype:
+            self.prototype.release(self)
+
+    # a pooled instance of prototype is used again, see ScenePrototype.instantiate
+    def reuseInstance(self, prototype:ScenePrototype, offsetX:float=0.0, offsetY:float=0.0, angle:float=0.0):
+        self.resetBodies(offsetX, offsetY, angle)
+
+    # puts bodies back to their loaded state, used when reusing pooled instances.
+    # Bodies are woken and constraints rebuilt, chipmunk keeps the joint impulse
+    # of the last run inside them
+    def resetBodies(self, offsetX:float=0.0, offsetY:float=0.0, angle:float=0.0):
+        for body in self.bodies.values():
+            body.position = (offsetX, offsetY)
+            body.angle = angle
+            body.velocity = (0.0, 0.0)
+            body.angular_velocity = 0.0
+            body.force = (0.0, 0.0)
+            body.torque = 0.0
+            if body.body_type != pymunk.Body.STATIC:
+                # clears the bias velocity of the last solve, see loaderSnapshot.restoreSnapshot
+                pymunk.Body.update_position(body, 0.0)
+                if body.space is not None:
+                    body.activate()
+        added = set(self.space.constraints) if self.space is not None else set()
+        for label, constraint in self.constraints.items():
+            rebuilt = self.constraints[label] = rebuildConstraint(constraint)
+            if constraint in added:
+                self.space.remove(constraint)
+                self.space.add(rebuilt)
+
+    # mutable state of the loaded bodies and constraints as one flat float array,
+    # see loaderSnapshot.snapshotLayout for the offsets of every label
+    def snapshot(self):
+        return takeSnapshot(self)
+
+    # writes into the existing objects, resetSolver re-adds them first so the
+    # steps after the restore do not depend on the run before it, see
+    # loaderSnapshot.restoreSnapshots (several loaders in one space go together)
+    def restore(self, data, resetSolver:bool=False):
+        restoreSnapshots([self], [data], resetSolver)
+
+    def snapshotLayout(self) -> Tuple[Dict[str, Tuple[int, int]], Dict[str, Tuple[int, int]]]:
+        return snapshotLayout(self)
+
+    # optional pass after everything is added, see spaceTuning.tuneSpace
+    def tuneSpace(self) -> Dict:
+        return tuneSpace(self.space)
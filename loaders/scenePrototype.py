@@ -0,0 +1,217 @@
+import pymunk
+
+from typing import Dict, List, Tuple
+import json
+import math
+
+
+BODY_TYPES = {'Dynamic': pymunk.Body.DYNAMIC,
+              'Kinematic': pymunk.Body.KINEMATIC,
+              'Static': pymunk.Body.STATIC}
+
+SHAPE_POLY = 0
+SHAPE_CIRCLE = 1
+SHAPE_SEGMENT = 2
+
+# constraint class and keys of its positional arguments (after both bodies)
+CONSTRAINT_ARGS = {"Rotary Spring": (pymunk.constraints.DampedRotarySpring, ('restAngle', 'stiffness', 'damping')),
+                   "Damped Spring": (pymunk.constraints.DampedSpring, ('anchorA', 'anchorB', 'restLength', 'stiffness', 'damping')),
+                   "Gear": (pymunk.constraints.GearJoint, ('phase', 'ratio')),
+                   "Groove": (pymunk.constraints.GrooveJoint, ('grooveA', 'grooveB', 'anchorB')),
+                   "Pin": (pymunk.constraints.PinJoint, ('anchorA', 'anchorB')),
+                   "Pivot": (pymunk.constraints.PivotJoint, ('anchorA', 'anchorB')),
+                   "Ratchet": (pymunk.constraints.RatchetJoint, ('phase', 'ratchet')),
+                   "Rotary Limit": (pymunk.constraints.RotaryLimitJoint, ('min', 'max')),
+                   "Motor": (pymunk.constraints.SimpleMotor, ('rate',)),
+                   "Slide": (pymunk.constraints.SlideJoint, ('anchorA', 'anchorB', 'min', 'max'))}
+
+
+class ShapeRecord:
+    __slots__ = ('label', 'kind', 'args', 'elasticity', 'friction', 'sensor', 'filter', 'mass', 'density')
+
+    def __init__(self, label:str, kind:int, args:Tuple, physics:Dict, mass:float):
+        self.label = label
+        self.kind = kind
+        self.args = args
+        self.elasticity = physics.get('elasticity', 0.0)
+        self.friction = physics.get('friction', 1.0)
+        self.sensor = physics.get('isSensor', False)
+        self.filter = pymunk.ShapeFilter(physics.get('filterGroup', 0),
+                                         physics.get('filterCategory', 0xFFFFFFFF),
+                                         physics.get('filterMask', 0xFFFFFFFF))
+        # either mass or density is set, the other one stays None
+        self.mass = mass if physics['hasCustomMass'] else None
+        self.density = None if physics['hasCustomMass'] else physics['customDensity']
+
+
+class BodyRecord:
+    __slots__ = ('label', 'bodyType', 'physics', 'shapes', 'lines', 'data')
+
+    def __init__(self, label:str, bodyType:int, physics:Dict, data:Dict):
+        self.label = label
+        self.bodyType = bodyType
+        self.physics = physics
+        self.shapes:List[ShapeRecord] = []
+        self.lines:Dict[str, List[ShapeRecord]] = {}
+        # exported shapes, built by PymunkLoader.loadShape when the loader
+        # simplifies, decomposes or bakes them
+        self.data = data
+
+
+class ConstraintRecord:
+    __slots__ = ('label', 'cls', 'bodyA', 'bodyB', 'args', 'maxBias', 'errorBias', 'maxForce', 'collideBodies')
+
+    def __init__(self, label:str, constraint:Dict, bodyIndex:Dict[str, int]):
+        cls, keys = CONSTRAINT_ARGS[constraint['type']]
+        self.label = label
+        self.cls = cls
+        self.bodyA = bodyIndex[constraint['bodyA']]
+        self.bodyB = bodyIndex[constraint['bodyB']]
+        self.args = tuple(tuple(constraint[key]) if isinstance(constraint[key], list) else constraint[key] for key in keys)
+        self.maxBias = constraint.get('maxBias', float("inf"))
+        self.errorBias = constraint.get('errorBias', pow(0.9, 60))
+        self.maxForce = constraint.get('maxForce', float("inf"))
+        self.collideBodies = constraint.get('selfCollide', False)
+
+
+# exported scene parsed and validated once, then instantiated many times
+class ScenePrototype:
+
+    def __init__(self, obj:Dict):
+        self.bodies:List[BodyRecord] = []
+        self.constraints:List[ConstraintRecord] = []
+        self.textures:Dict = obj.get('Textures', {})
+        self.mappings:Dict = obj.get('Mappings', {})
+        self.version:str = obj.get('Version', '')
+        # unloaded instances kept for reuse, per loader class
+        self.pools:Dict[type, List] = {}
+
+        bodyIndex:Dict[str, int] = {}
+        for label, body in obj['Bodies'].items():
+            bodyIndex[label] = len(self.bodies)
+            self.bodies.append(self.parseBody(body, label))
+
+        for label, constraint in obj['Constraints'].items():
+            if constraint['type'] not in CONSTRAINT_ARGS:
+                continue
+            if constraint['bodyA'] not in bodyIndex or constraint['bodyB'] not in bodyIndex:
+                raise ValueError(f'constraint {label} references unknown body')
+            self.constraints.append(ConstraintRecord(label, constraint, bodyIndex))
+
+        for label, mapping in self.mappings.items():
+            if mapping['body'] not in bodyIndex:
+                raise ValueError(f'mapping {label} references unknown body')
+            if mapping['textureChannel'] not in self.textures:
+                raise ValueError(f'mapping {label} references unknown texture channel')
+
+    @staticmethod
+    def fromFile(path:str) -> 'ScenePrototype':
+        with open(path, 'r') as f:
+            return ScenePrototype(json.loads(f.read()))
+
+    def parseBody(self, data:Dict, label:str) -> BodyRecord:
+        record = BodyRecord(label, BODY_TYPES.get(data['type'], pymunk.Body.STATIC), data['physics'], data['shapes'])
+        for sLabel, shape in data['shapes'].items():
+            typ:str = shape['type']
+            physics:Dict = shape['physics']
+            internal:Dict = shape['internal']
+            radius:float = internal['radius']
+            if typ in ('Polygon', "Box", "Rect"):
+                points = tuple((point[0], point[1]) for point in internal['points'])
+                record.shapes.append(ShapeRecord(sLabel, SHAPE_POLY, (points, None, radius), physics, physics['customMass']))
+            elif typ == 'Circle':
+                offset = tuple(internal['offset'])
+                record.shapes.append(ShapeRecord(sLabel, SHAPE_CIRCLE, (radius, offset), physics, physics['customMass']))
+            elif typ == 'Line':
+                lines = []
+                for point in internal['points']:
+                    mass = 0.0
+                    if physics['hasCustomMass']:
+                        length = math.sqrt((point[0] - point[2]) ** 2 + (point[1] - point[3]) ** 2)
+                        mass = length / physics['customMass']
+                    lines.append(ShapeRecord(sLabel, SHAPE_SEGMENT, ((point[0], point[1]), (point[2], point[3]), radius), physics, mass))
+                record.lines[sLabel] = lines
+            else:
+                raise ValueError(f'shape {sLabel} has unknown type {typ}')
+        return record
+
+    @staticmethod
+    def createShape(record:ShapeRecord, body:pymunk.Body) -> pymunk.Shape:
+        if record.kind == SHAPE_POLY:
+            s = pymunk.Poly(body, *record.args)
+        elif record.kind == SHAPE_CIRCLE:
+            s = pymunk.Circle(body, *record.args)
+        else:
+            s = pymunk.Segment(body, *record.args)
+        s.elasticity = record.elasticity
+        s.friction = record.friction
+        s.sensor = record.sensor
+        s.filter = record.filter
+        if record.mass is not None:
+            s.mass = record.mass
+        else:
+            s.density = record.density
+        return s
+
+    # returns the bodies by label and the constraints it created
+    def build(self, loader, offsetX:float=0.0, offsetY:float=0.0, angle:float=0.0) -> Tuple[Dict[str, pymunk.Body], List[pymunk.Constraint]]:
+        createShape = self.createShape
+        processShapes = loader.hasShapeProcessing()
+        bodies:List[pymunk.Body] = []
+        constraints:List[pymunk.Constraint] = []
+        for record in self.bodies:
+            body = pymunk.Body(body_type = record.bodyType)
+            body.position = (offsetX, offsetY)
+            body.angle = angle
+            bodies.append(body)
+            loader.bodies[record.label] = body
+            if processShapes:
+                for label, shape in record.data.items():
+                    loader.loadShape(shape, label, body)
+                loader.bodiesPhysics[record.label] = loader.keptPhysics(body, record.physics)
+                continue
+            loader.bodiesPhysics[record.label] = record.physics
+            for shape in record.shapes:
+                s = loader.shapes[shape.label] = createShape(shape, body)
+                loader.keepShape(body, s)
+            for label, lines in record.lines.items():
+                loader.lines[label] = [createShape(line, body) for line in lines]
+                for s in loader.lines[label]:
+                    loader.keepShape(body, s)
+
+        for record in self.constraints:
+            constraintObj = record.cls(bodies[record.bodyA], bodies[record.bodyB], *record.args)
+            constraintObj.max_bias = record.maxBias
+            constraintObj.error_bias = record.errorBias
+            constraintObj.max_force = record.maxForce
+            constraintObj.collide_bodies = record.collideBodies
+            loader.constraints[record.label] = constraintObj
+            constraints.append(constraintObj)
+        return {record.label: body for record, body in zip(self.bodies, bodies)}, constraints
+
+    def instantiate(self, space:pymunk.Space, offset:Tuple[float, float]=(0.0, 0.0), angle:float=0.0, loaderClass=None):
+        if loaderClass is None:
+            from .pymunkLoader import PymunkLoader
+            loaderClass = PymunkLoader
+        pool = self.pools.get(loaderClass)
+        if pool:
+            loader = pool.pop()
+            loader.setSpace(space)
+            loader.reuseInstance(self, offset[0], offset[1], angle)
+        else:
+            loader = loaderClass(space)
+            loader.loadPrototype(self, offset[0], offset[1], angle)
+        loader.prototype = self
+        loader.addAll()
+        return loader
+
+    # keeps an unloaded instance for the next instantiate, called by its unload
+    def release(self, instance):
+        self.pools.setdefault(type(instance), []).append(instance)
+
+    # same as instance.unload(), the loader decides what it drops
+    def unload(self, instance):
+        instance.unload()
+
+    def clearPools(self):
+        self.pools.clear()
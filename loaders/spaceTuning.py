@@ -0,0 +1,94 @@
+import pymunk
+
+from typing import Dict, List
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# below this many dynamic shapes the default bounding box tree is always fine,
+# measured with pymunk 6.4 the tree stays competitive well into thousands
+MIN_DYNAMIC_SHAPES = 2000
+# fraction of their bounding area the dynamic shapes cover (density times the
+# median shape size squared), the hash only won on packed scenes like piles,
+# sparse debris ran as fast or faster on the tree at any count
+MIN_COVERAGE = 0.5
+# spatial hash degrades when shape sizes vary a lot or shapes span many cells
+MAX_SIZE_SPREAD = 4.0
+MAX_LARGE_STATIC_FRACTION = 0.1
+LARGE_STATIC_CELLS = 8.0
+# cell size relative to the median dynamic shape, measured best around 2
+CELL_SIZE_FACTOR = 2.0
+# chipmunk recommends up to about 10 cells per shape
+CELLS_PER_SHAPE = 10
+
+
+def analyseSpace(space:pymunk.Space) -> Dict:
+    dynamicSizes:List[float] = []
+    staticSizes:List[float] = []
+    left = bottom = dynamicLeft = dynamicBottom = float('inf')
+    right = top = dynamicRight = dynamicTop = float('-inf')
+    for shape in space.shapes:
+        bb = shape.cache_bb()
+        size = max(bb.right - bb.left, bb.top - bb.bottom)
+        if shape.body.body_type == pymunk.Body.STATIC:
+            staticSizes.append(size)
+        else:
+            dynamicSizes.append(size)
+            dynamicLeft = min(dynamicLeft, bb.left)
+            dynamicBottom = min(dynamicBottom, bb.bottom)
+            dynamicRight = max(dynamicRight, bb.right)
+            dynamicTop = max(dynamicTop, bb.top)
+        left = min(left, bb.left)
+        bottom = min(bottom, bb.bottom)
+        right = max(right, bb.right)
+        top = max(top, bb.top)
+    count = len(dynamicSizes) + len(staticSizes)
+    area = (right - left) * (top - bottom) if count else 0.0
+    # dynamic shapes alone, long static floors would dilute the density
+    dynamicArea = (dynamicRight - dynamicLeft) * (dynamicTop - dynamicBottom) if dynamicSizes else 0.0
+    return {'dynamicShapes': len(dynamicSizes),
+            'staticShapes': len(staticSizes),
+            'dynamicSizes': dynamicSizes,
+            'staticSizes': staticSizes,
+            'area': area,
+            'density': count / area if area > 0.0 else 0.0,
+            'dynamicArea': dynamicArea,
+            'dynamicDensity': len(dynamicSizes) / dynamicArea if dynamicArea > 0.0 else 0.0}
+
+
+# switches the space to a spatial hash when the loaded geometry suits it,
+# pymunk cannot switch back so this should run once, after everything is added
+def tuneSpace(space:pymunk.Space) -> Dict:
+    stats = analyseSpace(space)
+    dynamicSizes = stats.pop('dynamicSizes')
+    staticSizes = stats.pop('staticSizes')
+    choice = {'useSpatialHash': False, 'dim': 0.0, 'count': 0, 'coverage': 0.0, 'spread': 0.0, 'reason': ''}
+    choice.update(stats)
+
+    if len(dynamicSizes) < MIN_DYNAMIC_SHAPES:
+        choice['reason'] = f'only {len(dynamicSizes)} dynamic shapes'
+    else:
+        dynamicSizes.sort()
+        size = dynamicSizes[len(dynamicSizes) // 2]
+        dim = size * CELL_SIZE_FACTOR
+        spread = dynamicSizes[int(len(dynamicSizes) * 0.9)] / size if size > 0.0 else float('inf')
+        coverage = stats['dynamicDensity'] * size * size
+        largeStatic = sum(1 for size in staticSizes if size > dim * LARGE_STATIC_CELLS)
+        choice.update({'coverage': coverage, 'spread': spread})
+        if spread > MAX_SIZE_SPREAD:
+            choice['reason'] = f'dynamic shape sizes vary too much ({spread:.1f}x)'
+        elif coverage < MIN_COVERAGE:
+            choice['reason'] = f'dynamic shapes cover {coverage:.2f} of their area'
+        elif staticSizes and largeStatic / len(staticSizes) > MAX_LARGE_STATIC_FRACTION:
+            choice['reason'] = f'{largeStatic} static shapes span more than {LARGE_STATIC_CELLS:.0f} cells'
+        else:
+            # enough cells to cover the dynamic area, bounded by the shape count
+            shapes = len(dynamicSizes) + len(staticSizes)
+            count = int(min(max(stats['dynamicArea'] / (dim * dim), shapes), shapes * CELLS_PER_SHAPE))
+            space.use_spatial_hash(dim, count)
+            choice.update({'useSpatialHash': True, 'dim': dim, 'count': count,
+                           'reason': f'{len(dynamicSizes)} similar sized dynamic shapes covering {coverage:.2f} of their area'})
+
+    LOG.info('broadphase: spatial hash=%s dim=%.3f count=%d (%s)',
+             choice['useSpatialHash'], choice['dim'], choice['count'], choice['reason'])
+    return choice
@@ -0,0 +1,125 @@
+import arcade
+import PIL.Image
+
+from collections import OrderedDict
+import threading
+from typing import Dict, Tuple
+
+
+class CachedRegion:
+    __slots__ = ('key', 'texture', 'refs', 'bytes')
+
+    def __init__(self, key:Tuple, texture:arcade.Texture):
+        self.key = key
+        self.texture = texture
+        self.refs = 0
+        self.bytes = texture.width * texture.height * 4
+
+
+# process wide cache of texture regions, one decoded image per file;
+# released regions and images without regions stay cached until unused
+# memory exceeds maxUnusedBytes. All methods are thread safe
+class TextureCache:
+
+    _instance: "TextureCache" = None
+
+    @staticmethod
+    def getInstance() -> "TextureCache":
+        if TextureCache._instance == None:
+            TextureCache._instance = TextureCache()
+        return TextureCache._instance
+
+    def __init__(self, maxUnusedBytes:int=64 * 1024 * 1024):
+        self.maxUnusedBytes = maxUnusedBytes
+        # reentrant, acquire and release call getImage and evict with it held
+        self.lock = threading.RLock()
+        self.images:Dict[str, PIL.Image.Image] = {}
+        # number of cached regions cut from each image
+        self.imageRegions:Dict[str, int] = {}
+        self.regions:Dict[Tuple, CachedRegion] = {}
+        self.byName:Dict[str, CachedRegion] = {}
+        self.unused:'OrderedDict[Tuple, CachedRegion]' = OrderedDict()
+        self.unusedBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.diskLoads = 0
+
+    # called from loader worker threads too
+    def getImage(self, path:str) -> PIL.Image.Image:
+        with self.lock:
+            image = self.images.get(path)
+            if image is None:
+                image = PIL.Image.open(path).convert('RGBA')
+                self.images[path] = image
+                self.imageRegions[path] = 0
+                self.diskLoads += 1
+            return image
+
+    def acquire(self, path:str, x:int, y:int, width:int, height:int) -> arcade.Texture:
+        key = (path, x, y, width, height)
+        with self.lock:
+            region = self.regions.get(key)
+            if region is None:
+                self.misses += 1
+                image = self.getImage(path).crop((x, y, x + width, y + height))
+                region = CachedRegion(key, arcade.Texture(f'{path}-{x}-{y}-{width}-{height}', image))
+                self.regions[key] = region
+                self.byName[region.texture.name] = region
+                self.imageRegions[path] += 1
+            else:
+                self.hits += 1
+                if region.refs == 0:
+                    del self.unused[key]
+                    self.unusedBytes -= region.bytes
+            region.refs += 1
+            return region.texture
+
+    def release(self, texture:arcade.Texture):
+        with self.lock:
+            region = self.byName.get(texture.name)
+            if region is None or region.refs == 0:
+                return
+            region.refs -= 1
+            if region.refs == 0:
+                self.unused[region.key] = region
+                self.unusedBytes += region.bytes
+                self.evict(self.maxUnusedBytes)
+
+    @staticmethod
+    def imageBytes(image:PIL.Image.Image) -> int:
+        return image.width * image.height * 4
+
+    # drops least recently released regions until unused ones fit into maxBytes,
+    # then images no region is cut from, oldest first. Those also come from
+    # decodeFile pre-decoding for a job that failed before acquiring them
+    def evict(self, maxBytes:int=0):
+        with self.lock:
+            while self.unused and self.unusedBytes > maxBytes:
+                key, region = self.unused.popitem(last=False)
+                self.unusedBytes -= region.bytes
+                del self.regions[key]
+                del self.byName[region.texture.name]
+                self.imageRegions[key[0]] -= 1
+
+            orphans = [path for path, count in self.imageRegions.items() if count == 0]
+            orphanBytes = sum(self.imageBytes(self.images[path]) for path in orphans)
+            for path in orphans:
+                if self.unusedBytes + orphanBytes <= maxBytes:
+                    break
+                orphanBytes -= self.imageBytes(self.images[path])
+                del self.images[path]
+                del self.imageRegions[path]
+
+    def memoryUsage(self) -> Dict[str, int]:
+        with self.lock:
+            imageBytes = sum(self.imageBytes(image) for image in self.images.values())
+            regionBytes = sum(region.bytes for region in self.regions.values())
+            return {'images': len(self.images),
+                    'imageBytes': imageBytes,
+                    'regions': len(self.regions),
+                    'regionBytes': regionBytes,
+                    'unusedRegions': len(self.unused),
+                    'unusedBytes': self.unusedBytes,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'diskLoads': self.diskLoads}
@@ -4,6 +4,8 @@ import random
 import pymunk
 
 from loaders.arcadeLoader import SpriteLoader
+from loaders.fixedStepRunner import FixedStepRunner
+from loaders.inputRecording import InputRecorder, InputReplayer, InputRecording
 
 import sys
 
@@ -31,6 +33,14 @@ class Keys:
             return self.k[key]
         return False
 
+    # one bit per key, in the order of the dict above
+    def getMask(self) -> int:
+        return sum(1 << i for i, pressed in enumerate(self.k.values()) if pressed)
+
+    def setMask(self, mask:int):
+        for i, key in enumerate(self.k):
+            self.k[key] = bool(mask & (1 << i))
+
 class Camera(arcade.Camera):
 
     def __init__(self):
@@ -65,23 +75,47 @@ class Camera(arcade.Camera):
 
 class Runner(arcade.Window):
 
-    def __init__(self, width, height, title):
+    def __init__(self, width, height, title, record:str=None, replay:str=None):
         super().__init__(width, height, title, resizable=True)
         self.keys = Keys()
         self.space = pymunk.Space()
         self.space.gravity = (0.0, -9.81)
         self.level = SpriteLoader(self.space)
+        self.level.enableStreaming(20.0, 2)
         self.level.loadFile('data/states/level.json')
         self.level.addAll()
         self.vehicle = SpriteLoader(self.space)
         self.vehicle.loadFile('data/states/car1.json')
         self.vehicle.addAll()
+        self.vec = self.vehicle.bodies["BODY"].position
+        self.level.updateFocus(self.vec.x, self.vec.y)
 
         self.camera = Camera()
         self.camera.setWidthInMeters(40.0)
         self.camera.update()
 
         self.dt = 0.016
+        self.stepper = FixedStepRunner(self.space, 0.016)
+        self.stepper.beforeStep = self.applyInput
+        self.stepper.addLoader(self.level)
+        self.stepper.addLoader(self.vehicle)
+
+        self.recordPath = record
+        self.recorder = None
+        self.replayer = None
+        if record:
+            self.recorder = InputRecorder([self.level, self.vehicle], self.stepper.dt)
+            self.recorder.onSpace = self.setSpace
+        elif replay:
+            self.replayer = InputReplayer(InputRecording.loadFile(replay), self.space,
+                                          [self.level, self.vehicle], self.simulateInput)
+            self.replayer.onSpace = self.setSpace
+            self.stepper.beforeStep = self.replayer.beforeStep
+
+    # checkpoints of recordings and replays move the loaders to a new space
+    def setSpace(self, space: pymunk.Space):
+        self.space = space
+        self.stepper.space = space
 
     def on_resize(self, width: float, height: float):
         self.camera.resize(width, height)
@@ -98,29 +132,48 @@ class Runner(arcade.Window):
     def on_key_release(self, key: int, modifiers: int):
         self.keys.unsetKey(key)
 
-    def on_update(self, delta_time: float):
-        if 'Wheel' not in self.vehicle.bodies:
-            print(self.vehicle.bodies.keys())
-
-            sys.exit(-1)
+    def on_close(self):
+        if self.recorder:
+            self.recorder.save(self.recordPath)
+        if self.replayer and self.replayer.mismatches:
+            print('replay diverged at steps', self.replayer.mismatches)
+        super().on_close()
+
+    def applyInput(self, dt: float):
+        mask = self.keys.getMask()
+        if self.recorder:
+            self.recorder.record(mask)
+        self.simulateInput(mask, dt)
+
+    # everything a fixed step does with the input, replays call it with recorded masks
+    def simulateInput(self, mask: int, dt: float):
+        self.keys.setMask(mask)
+        self.vec = self.vehicle.bodies["BODY"].position
+        self.level.updateFocus(self.vec.x, self.vec.y)
         wheel = self.vehicle.bodies['Wheel']
 
         # TODO ###############
         wheel.angular_velocity *= 0.95
         if self.keys.isPressed(arcade.key.W):
-            wheel.angular_velocity = max(-30.0, wheel.angular_velocity - 10.5 * self.dt / 0.016)
+            wheel.angular_velocity = max(-30.0, wheel.angular_velocity - 10.5 * dt / 0.016)
         if self.keys.isPressed(arcade.key.S):
-            wheel.angular_velocity = min(7.0, wheel.angular_velocity + 5 * self.dt / 0.016)
+            wheel.angular_velocity = min(7.0, wheel.angular_velocity + 5 * dt / 0.016)
         print(wheel.angular_velocity)
+        # slow motion
         if self.keys.isPressed(arcade.key.LSHIFT):
             self.dt = max (0.002, self.dt - 0.0003)
         else:
             self.dt = min (0.016, self.dt + 0.0003)
+        self.stepper.timeScale = self.dt / 0.016
         # ###################
-        
-        self.space.step(self.dt)
-        self.level.update()
-        self.vehicle.update()
+
+    def on_update(self, delta_time: float):
+        if 'Wheel' not in self.vehicle.bodies:
+            print(self.vehicle.bodies.keys())
+
+            sys.exit(-1)
+
+        self.stepper.update(delta_time)
         #self.ttest.update()
         self.vec = self.vehicle.bodies["BODY"].position
         self.camera.move(self.vec)
@@ -134,4 +187,8 @@ class Runner(arcade.Window):
         self.vehicle.draw()
 
 
-Runner(800, 600, "ShaderTest").run()
\ No newline at end of file
+# python test.py [--record file | --replay file]
+args = sys.argv[1:]
+Runner(800, 600, "ShaderTest",
+       record=args[1] if args[:1] == ['--record'] else None,
+       replay=args[1] if args[:1] == ['--replay'] else None).run()
\ No newline at end of file